@@ -4,36 +4,163 @@ Salesforce Org Metadata Extraction with Claude AI Analysis
 Fetches metadata and uses Claude to generate intelligent insights
 """
 
+import hashlib
 import json
 import os
-from datetime import datetime, timezone
-from simple_salesforce import Salesforce
-from typing import Dict, List, Any, Iterable, Union
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from itertools import chain, islice
+from urllib.parse import quote
+from pathlib import Path
+from simple_salesforce import Salesforce, SalesforceExpiredSession
+from typing import Dict, List, Any, Optional, Tuple
 from anthropic import Anthropic
 from dotenv import load_dotenv
 
+from claude_common import (
+    PROMPT_CACHING_HEADERS,
+    build_cached_org_context_blocks,
+    extract_text_from_blocks,
+    save_json,
+    to_builtins,
+    utc_now_iso
+)
+
 # Load environment variables from .env file
 load_dotenv()
 
-def utc_now_iso() -> str:
-    """Return current UTC timestamp as ISO string."""
-    return datetime.now(timezone.utc).isoformat()
+# Salesforce caps a single Composite API request at 25 subrequests, of
+# which at most 5 may be queries
+COMPOSITE_SUBREQUEST_LIMIT = 25
+COMPOSITE_QUERY_SUBREQUEST_LIMIT = 5
+
+# Key-object fields are only consumed by name/label/type downstream, so keep
+# the saved metadata small
+KEY_FIELD_PROJECTION = ('name', 'label', 'type', 'custom')
 
-def extract_text_from_blocks(content: Iterable[Union[Dict[str, Any], Any]]) -> str:
-    """Normalize Anthropic content blocks into a single text string."""
-    text_parts: List[str] = []
+# Stay well under Salesforce's per-user concurrent API request limit
+FETCH_MAX_WORKERS = 5
 
-    for block in content:
-        if isinstance(block, dict):
-            if block.get("type") == "text":
-                text_parts.append(block.get("text", ""))
-            continue
+# Reuse a previous run's session instead of logging in again while it is
+# younger than this (Salesforce's default session timeout is 2 hours)
+SESSION_CACHE_DIR = Path.home() / '.cache' / 'clientell-promper'
+SESSION_CACHE_TTL_SECONDS = 2 * 60 * 60
 
-        block_type = getattr(block, "type", None)
-        if block_type == "text":
-            text_parts.append(getattr(block, "text", ""))
+ANALYSIS_TASK = """Analyze the Salesforce org described in the context above and provide:
 
-    return "\n\n".join(part.strip() for part in text_parts if part)
+1. **Org Overview**: Brief summary of the org type and key characteristics
+2. **Custom Objects Analysis**: What custom objects exist and what they might be used for
+3. **Testing Opportunities**: Specific test scenarios based on the metadata
+4. **Prompt Recommendations**: Suggest 5-10 context-aware test prompts that leverage the actual metadata
+5. **Challenge Scenarios**: Recommend specific changes to create challenging test conditions
+
+Provide your analysis in a structured format."""
+
+def _project_field(field: Dict[str, Any],
+                   fields_projection: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+    """Project a raw describe() field into the attributes we keep.
+
+    When fields_projection is given, only those base attributes are kept;
+    picklist values and lookup targets are still added when present.
+    """
+    field_data = {
+        'name': field['name'],
+        'label': field['label'],
+        'type': field['type'],
+        'custom': field.get('custom', False),
+        'length': field.get('length'),
+        'unique': field.get('unique'),
+        'nillable': field.get('nillable'),
+        'updateable': field.get('updateable'),
+        'createable': field.get('createable'),
+    }
+    if fields_projection is not None:
+        field_data = {key: field_data[key] for key in fields_projection}
+    
+    if field['type'] in ('picklist', 'multipicklist'):
+        field_data['picklistValues'] = [
+            pv['value'] for pv in field.get('picklistValues', [])
+        ]
+    
+    if field.get('referenceTo'):
+        field_data['referenceTo'] = field['referenceTo']
+        field_data['relationshipName'] = field.get('relationshipName')
+    
+    return field_data
+
+def _session_cache_path(username: str) -> Path:
+    """Per-user session cache file; the username is hashed so it never lands on disk."""
+    digest = hashlib.sha1(username.encode('utf-8')).hexdigest()
+    return SESSION_CACHE_DIR / f"sf-session-{digest}.json"
+
+def _load_cached_session(username: str) -> Optional[Dict[str, Any]]:
+    """Return the cached session for username if one exists and has not expired."""
+    try:
+        cached = json.loads(_session_cache_path(username).read_text())
+    except (OSError, ValueError):
+        return None
+    if time.time() - cached.get('ts', 0) >= SESSION_CACHE_TTL_SECONDS:
+        return None
+    return cached
+
+def _save_cached_session(username: str, sf: Salesforce) -> None:
+    """Persist the session token and instance, readable by the current user only."""
+    path = _session_cache_path(username)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({
+                'access_token': sf.session_id,
+                'instance_url': sf.sf_instance,
+                'ts': time.time()
+            }, f)
+    except OSError as e:
+        # Caching is an optimization; never fail the run over it
+        print(f"   ⚠️  Could not cache Salesforce session: {str(e)}")
+
+def _clear_cached_session(username: str) -> None:
+    """Drop a cached session that Salesforce has rejected."""
+    try:
+        _session_cache_path(username).unlink()
+    except OSError:
+        pass
+
+class FieldMeta:
+    """Slotted projection of a describe() field, as kept in the objects cache."""
+    __slots__ = KEY_FIELD_PROJECTION + ('picklistValues', 'referenceTo', 'relationshipName')
+
+    def __init__(self, name: str, label: str, type: str, custom: bool = False,
+                 picklistValues: Optional[List[str]] = None,
+                 referenceTo: Optional[List[str]] = None,
+                 relationshipName: Optional[str] = None):
+        self.name = name
+        self.label = label
+        self.type = type
+        self.custom = custom
+        self.picklistValues = picklistValues
+        self.referenceTo = referenceTo
+        self.relationshipName = relationshipName
+
+class SObjectMeta:
+    """Slotted summary of a queryable sObject and its key fields."""
+    __slots__ = ('label', 'custom', 'keyPrefix', 'fields')
+
+    def __init__(self, label: str, custom: bool, keyPrefix: Optional[str],
+                 fields: Optional[List[FieldMeta]] = None):
+        self.label = label
+        self.custom = custom
+        self.keyPrefix = keyPrefix
+        self.fields = fields if fields is not None else []
+
+def _slim_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop the 'attributes' envelope Salesforce echoes on every record and relationship."""
+    return {
+        key: _slim_record(value) if isinstance(value, dict) else value
+        for key, value in record.items()
+        if key != 'attributes'
+    }
 
 class SalesforceMetadataExtractor:
     def __init__(self, username: str, password: str, security_token: str, 
@@ -44,28 +171,31 @@ class SalesforceMetadataExtractor:
         self.password = password
         self.security_token = security_token
         self.domain = domain
+        self._metadata_lock = threading.Lock()
         
         # Initialize Claude client
         self.claude = Anthropic(api_key=anthropic_api_key)
         self.model_id = os.getenv("ANTHROPIC_MODEL", "claude-3-opus-20240229")
         
+        # Sections are added by the fetchers as they complete, so the saved
+        # metadata only contains what was actually extracted
         self.metadata = {
-            "extraction_timestamp": utc_now_iso(),
-            "org_info": {},
-            "objects": {},
-            "flows": [],
-            "reports": [],
-            "validation_rules": [],
-            "apex_classes": [],
-            "profiles": [],
-            "users": [],
-            "sample_data": {},
-            "claude_analysis": {},
-            "warnings": []
+            "extraction_timestamp": utc_now_iso()
         }
     
-    def connect(self):
-        """Establish connection to Salesforce"""
+    def connect(self, use_cached_session: bool = True):
+        """Establish connection to Salesforce, reusing a cached session when possible"""
+        cached = _load_cached_session(self.username) if use_cached_session else None
+        if cached:
+            # Skips the SOAP login; an expired token surfaces as a 401 on the
+            # first query and extract_all() retries with a full login
+            self.sf = Salesforce(
+                instance=cached['instance_url'],
+                session_id=cached['access_token']
+            )
+            print("✅ Connected to Salesforce (cached session)")
+            return
+        
         try:
             # Use synchronous Salesforce connection
             self.sf = Salesforce(
@@ -75,6 +205,7 @@ class SalesforceMetadataExtractor:
                 domain=self.domain
             )
             print("✅ Connected to Salesforce")
+            _save_cached_session(self.username, self.sf)
         except Exception as e:
             print(f"❌ Failed to connect to Salesforce: {str(e)}")
             raise
@@ -89,7 +220,8 @@ class SalesforceMetadataExtractor:
         """
         result = self.sf.query_all(org_query)
         if result['records']:
-            self.metadata['org_info'] = result['records'][0]
+            with self._metadata_lock:
+                self.metadata['org_info'] = result['records'][0]
             print(f"   Org: {self.metadata['org_info'].get('Name')}")
             print(f"   Type: {self.metadata['org_info'].get('OrganizationType')}")
             print(f"   Sandbox: {self.metadata['org_info'].get('IsSandbox')}")
@@ -98,51 +230,26 @@ class SalesforceMetadataExtractor:
         """Get all standard and custom objects"""
         print("\n📦 Fetching all objects...")
         describe = self.sf.describe()
+        objects = self.metadata.setdefault('objects', {})
         
         for sobject in describe['sobjects']:
             obj_name = sobject['name']
             
             if sobject['queryable'] and sobject['retrieveable']:
-                self.metadata['objects'][obj_name] = {
-                    'label': sobject['label'],
-                    'custom': sobject['custom'],
-                    'keyPrefix': sobject['keyPrefix'],
-                    'fields': []
-                }
+                objects[obj_name] = SObjectMeta(
+                    label=sobject['label'],
+                    custom=sobject['custom'],
+                    keyPrefix=sobject['keyPrefix']
+                )
         
-        print(f"   Found {len(self.metadata['objects'])} queryable objects")
+        print(f"   Found {len(objects)} queryable objects")
     
-    def fetch_object_fields(self, object_name: str):
+    def fetch_object_fields(self, object_name: str,
+                            fields_projection: Optional[Tuple[str, ...]] = None):
         """Get all fields for a specific object"""
         try:
             describe = getattr(self.sf, object_name).describe()
-            fields = []
-            
-            for field in describe['fields']:
-                field_data = {
-                    'name': field['name'],
-                    'label': field['label'],
-                    'type': field['type'],
-                    'custom': field.get('custom', False),
-                    'length': field.get('length'),
-                    'unique': field.get('unique'),
-                    'nillable': field.get('nillable'),
-                    'updateable': field.get('updateable'),
-                    'createable': field.get('createable'),
-                }
-                
-                if field['type'] in ('picklist', 'multipicklist'):
-                    field_data['picklistValues'] = [
-                        pv['value'] for pv in field.get('picklistValues', [])
-                    ]
-                
-                if field.get('referenceTo'):
-                    field_data['referenceTo'] = field['referenceTo']
-                    field_data['relationshipName'] = field.get('relationshipName')
-                
-                fields.append(field_data)
-            
-            return fields
+            return [_project_field(field, fields_projection) for field in describe['fields']]
         except Exception as e:
             print(f"   ⚠️  Error fetching fields for {object_name}: {str(e)}")
             return []
@@ -156,16 +263,55 @@ class SalesforceMetadataExtractor:
             'User', 'Profile', 'RecordType'
         ]
         
-        custom_objects = [name for name, obj in self.metadata['objects'].items() 
-                         if obj['custom']]
+        objects = self.metadata.get('objects', {})
+        custom_objects = (name for name, obj in objects.items() if obj.custom)
         
-        all_objects = priority_objects + custom_objects[:20]
+        # Priority objects plus the first 20 custom ones; names missing from
+        # this org are dropped before they reach the composite request
+        candidates = list(islice(chain(priority_objects, custom_objects),
+                                 len(priority_objects) + 20))
+        all_objects = [name for name in candidates if name in objects]
         
-        for obj_name in all_objects:
-            if obj_name in self.metadata['objects']:
-                print(f"   Fetching fields for {obj_name}...")
-                fields = self.fetch_object_fields(obj_name)
-                self.metadata['objects'][obj_name]['fields'] = fields
+        # Describe the objects through the Composite API, at most
+        # COMPOSITE_SUBREQUEST_LIMIT per round trip
+        for start in range(0, len(all_objects), COMPOSITE_SUBREQUEST_LIMIT):
+            batch = all_objects[start:start + COMPOSITE_SUBREQUEST_LIMIT]
+            print(f"   Fetching fields for {', '.join(batch)}...")
+            
+            try:
+                result = self.sf.restful('composite', method='POST', json={
+                    "allOrNone": False,
+                    "compositeRequest": [
+                        {
+                            "method": "GET",
+                            "url": f"/services/data/v{self.sf.sf_version}/sobjects/{name}/describe",
+                            "referenceId": name
+                        }
+                        for name in batch
+                    ]
+                })
+            except Exception as e:
+                print(f"   ⚠️  Composite describe failed, falling back to per-object calls: {str(e)}")
+                for obj_name in batch:
+                    objects[obj_name].fields = [
+                        FieldMeta(**field_data)
+                        for field_data in self.fetch_object_fields(obj_name, KEY_FIELD_PROJECTION)
+                    ]
+                continue
+            
+            for sub in result.get('compositeResponse', []):
+                obj_name = sub.get('referenceId')
+                if sub.get('httpStatusCode') == 200:
+                    objects[obj_name].fields = [
+                        FieldMeta(**_project_field(field, KEY_FIELD_PROJECTION))
+                        for field in sub['body']['fields']
+                    ]
+                else:
+                    print(f"   ⚠️  Error fetching fields for {obj_name}: HTTP {sub.get('httpStatusCode')}")
+                    with self._metadata_lock:
+                        self.metadata.setdefault('warnings', []).append(
+                            f"Describe failed for {obj_name} (HTTP {sub.get('httpStatusCode')}): {sub.get('body')}"
+                        )
     
     def fetch_flows(self):
         """Get all flows with metadata"""
@@ -179,11 +325,16 @@ class SalesforceMetadataExtractor:
             ORDER BY LastModifiedDate DESC
         """
         
-        result = self.sf.query_all(flow_query)
-        self.metadata['flows'] = result['records']
+        flows = []
+        active_count = 0
+        for record in self.sf.query_all_iter(flow_query):
+            flow = _slim_record(record)
+            active_count += bool(flow.get('IsActive'))
+            flows.append(flow)
         
-        active_count = sum(1 for f in self.metadata['flows'] if f.get('IsActive'))
-        print(f"   Found {len(self.metadata['flows'])} flows ({active_count} active)")
+        with self._metadata_lock:
+            self.metadata['flows'] = flows
+        print(f"   Found {len(flows)} flows ({active_count} active)")
     
     def fetch_reports(self):
         """Get all reports"""
@@ -198,8 +349,9 @@ class SalesforceMetadataExtractor:
             LIMIT 500
         """
         
-        result = self.sf.query_all(report_query)
-        self.metadata['reports'] = result['records']
+        reports = [_slim_record(r) for r in self.sf.query_all_iter(report_query)]
+        with self._metadata_lock:
+            self.metadata['reports'] = reports
         print(f"   Found {len(self.metadata['reports'])} reports")
     
     def fetch_validation_rules(self):
@@ -220,14 +372,18 @@ class SalesforceMetadataExtractor:
                 action='query',
                 params={'q': vr_query}
             )
-            self.metadata['validation_rules'] = result.get('records', [])
+            with self._metadata_lock:
+                self.metadata['validation_rules'] = [
+                    _slim_record(r) for r in result.get('records', [])
+                ]
             print(f"   Found {len(self.metadata['validation_rules'])} validation rules")
         except Exception as e:
             print(f"   ⚠️  Error fetching validation rules: {str(e)}")
-            self.metadata['validation_rules'] = []
-            self.metadata['warnings'].append(
-                "ValidationRule query failed: {str(e)}. Try the query in Developer Console or confirm Tooling API access."
-            )
+            with self._metadata_lock:
+                self.metadata['validation_rules'] = []
+                self.metadata.setdefault('warnings', []).append(
+                    "ValidationRule query failed: {str(e)}. Try the query in Developer Console or confirm Tooling API access."
+                )
     
     def fetch_apex_classes(self):
         """Get Apex classes"""
@@ -246,7 +402,10 @@ class SalesforceMetadataExtractor:
                 action='query',
                 params={'q': apex_query}
             )
-            self.metadata['apex_classes'] = result.get('records', [])
+            with self._metadata_lock:
+                self.metadata['apex_classes'] = [
+                    _slim_record(r) for r in result.get('records', [])
+                ]
             print(f"   Found {len(self.metadata['apex_classes'])} Apex classes")
         except Exception as e:
             print(f"   ⚠️  Error fetching Apex classes: {str(e)}")
@@ -263,111 +422,103 @@ class SalesforceMetadataExtractor:
             LIMIT 50
         """
 
-        result = self.sf.query_all(user_query)
-        self.metadata['users'] = result['records']
+        users = [_slim_record(r) for r in self.sf.query_all_iter(user_query)]
+        with self._metadata_lock:
+            self.metadata['users'] = users
         print(f"   Found {len(self.metadata['users'])} active users")
 
     def fetch_sample_data(self):
         """Fetch sample records for test prompt generation"""
         print("\n📋 Fetching sample data...")
 
-        sample_data = {}
-
-        # Fetch sample Accounts
-        try:
-            account_query = "SELECT Id, Name FROM Account ORDER BY LastModifiedDate DESC LIMIT 10"
-            result = self.sf.query_all(account_query)
-            sample_data['accounts'] = [{'Id': r['Id'], 'Name': r['Name']} for r in result['records']]
-            print(f"   Found {len(sample_data['accounts'])} sample accounts")
-        except Exception as e:
-            print(f"   ⚠️  Error fetching accounts: {str(e)}")
-            sample_data['accounts'] = []
-
-        # Fetch sample Opportunities
-        try:
-            opp_query = "SELECT Id, Name, Amount, StageName FROM Opportunity ORDER BY LastModifiedDate DESC LIMIT 10"
-            result = self.sf.query_all(opp_query)
-            sample_data['opportunities'] = [
-                {'Id': r['Id'], 'Name': r['Name'], 'Amount': r.get('Amount'), 'StageName': r.get('StageName')}
-                for r in result['records']
-            ]
-            print(f"   Found {len(sample_data['opportunities'])} sample opportunities")
-        except Exception as e:
-            print(f"   ⚠️  Error fetching opportunities: {str(e)}")
-            sample_data['opportunities'] = []
-
-        # Fetch sample records from custom objects
-        custom_objects = [name for name, obj in self.metadata['objects'].items() if obj['custom']]
-
+        custom_objects = [name for name, obj in self.metadata.get('objects', {}).items() if obj.custom]
+
+        # (referenceId, SOQL, record projection) for every sample query; they
+        # go to Salesforce in Composite API requests of up to
+        # COMPOSITE_QUERY_SUBREQUEST_LIMIT queries each
+        sample_queries = [
+            ('accounts',
+             "SELECT Id, Name FROM Account ORDER BY LastModifiedDate DESC LIMIT 10",
+             lambda r: {'Id': r['Id'], 'Name': r['Name']}),
+            ('opportunities',
+             "SELECT Id, Name, Amount, StageName FROM Opportunity ORDER BY LastModifiedDate DESC LIMIT 10",
+             lambda r: {'Id': r['Id'], 'Name': r['Name'], 'Amount': r.get('Amount'), 'StageName': r.get('StageName')}),
+        ]
         for obj_name in custom_objects[:5]:  # Limit to first 5 custom objects
+            sample_queries.append((
+                obj_name,
+                f"SELECT Id, Name FROM {obj_name} ORDER BY LastModifiedDate DESC LIMIT 5",
+                lambda r: {'Id': r['Id'], 'Name': r.get('Name', 'N/A')}
+            ))
+
+        sample_data = {'accounts': [], 'opportunities': []}
+        warnings = []
+        responses = {}
+        for start in range(0, len(sample_queries), COMPOSITE_QUERY_SUBREQUEST_LIMIT):
+            batch = sample_queries[start:start + COMPOSITE_QUERY_SUBREQUEST_LIMIT]
             try:
-                query = f"SELECT Id, Name FROM {obj_name} ORDER BY LastModifiedDate DESC LIMIT 5"
-                result = self.sf.query_all(query)
-                sample_data[obj_name] = [{'Id': r['Id'], 'Name': r.get('Name', 'N/A')} for r in result['records']]
-                if sample_data[obj_name]:
-                    print(f"   Found {len(sample_data[obj_name])} sample {obj_name} records")
+                result = self.sf.restful('composite', method='POST', json={
+                    "allOrNone": False,
+                    "compositeRequest": [
+                        {
+                            "method": "GET",
+                            "url": f"/services/data/v{self.sf.sf_version}/query?q={quote(soql)}",
+                            "referenceId": ref
+                        }
+                        for ref, soql, _ in batch
+                    ]
+                })
+                for sub in result.get('compositeResponse', []):
+                    responses[sub.get('referenceId')] = sub
             except Exception as e:
-                # Skip if object has no Name field or other errors
-                pass
-
-        self.metadata['sample_data'] = sample_data
+                print(f"   ⚠️  Composite sample query failed, querying one by one: {str(e)}")
+                # Fall back to individual queries so the batch's Accounts and
+                # Opportunities aren't lost with it
+                for ref, soql, _ in batch:
+                    try:
+                        body = self.sf.query(soql)
+                        responses[ref] = {'httpStatusCode': 200, 'body': body}
+                    except Exception as query_error:
+                        responses[ref] = {'httpStatusCode': None, 'body': str(query_error)}
+
+        for ref, _, project in sample_queries:
+            sub = responses.get(ref)
+            if sub is None:
+                continue
+            if sub.get('httpStatusCode') != 200:
+                # Typically a custom object without a Name field
+                warnings.append(
+                    f"Sample query for {ref} failed (HTTP {sub.get('httpStatusCode')}): {sub.get('body')}"
+                )
+                continue
+            sample_data[ref] = [project(r) for r in sub['body'].get('records', [])]
+            if sample_data[ref]:
+                print(f"   Found {len(sample_data[ref])} sample {ref} records")
+
+        with self._metadata_lock:
+            self.metadata['sample_data'] = sample_data
+            if warnings:
+                self.metadata.setdefault('warnings', []).extend(warnings)
         print(f"   ✅ Sample data extraction complete")
 
     def analyze_with_claude(self):
         """Use Claude to analyze metadata and generate insights"""
         print("\n🤖 Analyzing metadata with Claude AI...")
         
-        # Prepare metadata summary for Claude
-        metadata_summary = {
-            'org_type': self.metadata['org_info'].get('OrganizationType'),
-            'is_sandbox': self.metadata['org_info'].get('IsSandbox'),
-            'custom_objects': [
-                {'name': name, 'label': obj['label']} 
-                for name, obj in self.metadata['objects'].items() 
-                if obj['custom']
-            ],
-            'total_flows': len(self.metadata['flows']),
-            'active_flows': sum(1 for f in self.metadata['flows'] if f.get('IsActive')),
-            'inactive_flows': sum(1 for f in self.metadata['flows'] if not f.get('IsActive')),
-            'total_reports': len(self.metadata['reports']),
-            'validation_rules': len(self.metadata['validation_rules']),
-        }
-        
-        # Find commission/financial fields
-        commission_objects = {}
-        for obj_name, obj_data in self.metadata['objects'].items():
-            commission_fields = [
-                f['name'] for f in obj_data.get('fields', [])
-                if any(kw in f['name'].lower() or kw in f['label'].lower() 
-                      for kw in ['commission', 'premium', 'amount', 'value', 'policy'])
-            ]
-            if commission_fields:
-                commission_objects[obj_name] = commission_fields[:5]  # Limit to 5
-        
-        metadata_summary['objects_with_financial_fields'] = commission_objects
-        
-        # Create prompt for Claude
-        prompt = f"""You are a Salesforce testing expert. Analyze this Salesforce org metadata and provide:
-
-1. **Org Overview**: Brief summary of the org type and key characteristics
-2. **Custom Objects Analysis**: What custom objects exist and what they might be used for
-3. **Testing Opportunities**: Specific test scenarios based on the metadata
-4. **Prompt Recommendations**: Suggest 5-10 context-aware test prompts that leverage the actual metadata
-5. **Challenge Scenarios**: Recommend specific changes to create challenging test conditions
-
-Metadata Summary:
-{json.dumps(metadata_summary, indent=2)}
-
-Provide your analysis in a structured format."""
+        # The org context is the shared, cached prefix; only the analysis ask
+        # is specific to this call.
+        system_blocks = build_cached_org_context_blocks(to_builtins(self.metadata))
 
         try:
             message = self.claude.messages.create(
                 model=self.model_id,
                 max_tokens=4096,
                 temperature=0.3,
+                system=system_blocks,
                 messages=[
-                    {"role": "user", "content": prompt}
-                ]
+                    {"role": "user", "content": ANALYSIS_TASK}
+                ],
+                extra_headers=PROMPT_CACHING_HEADERS
             )
 
             analysis = extract_text_from_blocks(message.content)
@@ -378,7 +529,9 @@ Provide your analysis in a structured format."""
                 'analysis': analysis or 'No analysis text returned by Claude.',
                 'usage': {
                     'input_tokens': getattr(message.usage, 'input_tokens', None),
-                    'output_tokens': getattr(message.usage, 'output_tokens', None)
+                    'output_tokens': getattr(message.usage, 'output_tokens', None),
+                    'cache_creation_input_tokens': getattr(message.usage, 'cache_creation_input_tokens', None),
+                    'cache_read_input_tokens': getattr(message.usage, 'cache_read_input_tokens', None)
                 }
             }
 
@@ -398,22 +551,40 @@ Provide your analysis in a structured format."""
                 'model': self.model_id,
                 'suggestions': suggestions
             }
-            self.metadata['warnings'].append(
+            self.metadata.setdefault('warnings', []).append(
                 f"Claude analysis failed: {str(e)}. {suggestions}"
             )
     
     def extract_all(self):
         """Main extraction workflow"""
         self.connect()
-        self.fetch_org_info()
-        self.fetch_all_objects()
-        self.fetch_key_object_fields()
-        self.fetch_flows()
-        self.fetch_reports()
-        self.fetch_validation_rules()
-        self.fetch_apex_classes()
-        self.fetch_users()
-        self.fetch_sample_data()
+        try:
+            self.fetch_all_objects()
+        except SalesforceExpiredSession:
+            print("   Cached session expired, logging in again...")
+            _clear_cached_session(self.username)
+            self.connect(use_cached_session=False)
+            self.fetch_all_objects()
+
+        # The remaining fetchers are independent I/O against Salesforce and
+        # each writes its own top-level key, so overlap them. Field and
+        # sample-data fetches only need the object list fetched above.
+        fetchers = (
+            self.fetch_org_info,
+            self.fetch_key_object_fields,
+            self.fetch_flows,
+            self.fetch_reports,
+            self.fetch_validation_rules,
+            self.fetch_apex_classes,
+            self.fetch_users,
+            self.fetch_sample_data,
+        )
+        with ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS) as executor:
+            futures = [executor.submit(fetcher) for fetcher in fetchers]
+            wait(futures)
+        for future in futures:
+            # Re-raise the first fetcher failure, as the serial workflow did
+            future.result()
 
         # Use Claude for analysis
         self.analyze_with_claude()
@@ -422,8 +593,7 @@ Provide your analysis in a structured format."""
     
     def save_metadata(self, filename: str = 'org_metadata_claude.json'):
         """Save metadata to JSON file"""
-        with open(filename, 'w') as f:
-            json.dump(self.metadata, f, indent=2, default=str)
+        save_json({k: v for k, v in self.metadata.items() if v}, filename)
         print(f"\n💾 Metadata saved to {filename}")
     
     def print_claude_analysis(self):
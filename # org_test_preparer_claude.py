@@ -4,72 +4,25 @@ Salesforce Org Test Preparation with Claude AI
 Creates challenging scenarios for agent testing
 """
 
-import json
 import os
-from datetime import datetime, timezone
-from typing import Any, Dict, Iterable, List, Union
 from anthropic import Anthropic
 from dotenv import load_dotenv
 
+from claude_common import (
+    PROMPT_CACHING_HEADERS,
+    build_cached_org_context_blocks,
+    extract_json_block,
+    extract_text_from_blocks,
+    load_json,
+    parse_json,
+    save_json,
+    utc_now_iso
+)
+
 # Load environment variables from .env file
 load_dotenv()
 
-def utc_now_iso() -> str:
-    """Return current UTC timestamp as ISO string."""
-    return datetime.now(timezone.utc).isoformat()
-
-def extract_text_from_blocks(content: Iterable[Union[Dict[str, Any], Any]]) -> str:
-    """Normalize Anthropic content blocks into a single text string."""
-    text_parts: List[str] = []
-
-    for block in content:
-        if isinstance(block, dict):
-            if block.get("type") == "text":
-                text_parts.append(block.get("text", ""))
-            continue
-
-        block_type = getattr(block, "type", None)
-        if block_type == "text":
-            text_parts.append(getattr(block, "text", ""))
-
-    return "\n".join(part.strip() for part in text_parts if part)
-
-class ClaudeTestPreparer:
-    def __init__(self, metadata_file: str = 'org_metadata_claude.json',
-                 anthropic_api_key: str = None):
-        """Load metadata and initialize Claude"""
-        with open(metadata_file, 'r') as f:
-            self.metadata = json.load(f)
-        
-        api_key = anthropic_api_key or os.getenv("ANTHROPIC_API_KEY")
-        self.claude = Anthropic(api_key=api_key)
-        self.model_id = os.getenv("ANTHROPIC_MODEL", "claude-3-opus-20240229")
-    
-    def generate_preparation_plan_with_claude(self):
-        """Use Claude to generate comprehensive test preparation plan"""
-        print("\n🤖 Generating test preparation plan with Claude AI...")
-        
-        # Prepare org context
-        org_context = {
-            'org_type': self.metadata['org_info'].get('OrganizationType'),
-            'is_sandbox': self.metadata['org_info'].get('IsSandbox'),
-            'custom_objects': [
-                name for name, obj in self.metadata['objects'].items()
-                if obj.get('custom')
-            ][:10],
-            'flows': {
-                'total': len(self.metadata['flows']),
-                'active': [f['ApiName'] for f in self.metadata['flows'] if f.get('IsActive')][:5],
-                'inactive': [f['ApiName'] for f in self.metadata['flows'] if not f.get('IsActive')][:5]
-            },
-            'reports': len(self.metadata['reports']),
-            'validation_rules': len(self.metadata['validation_rules'])
-        }
-        
-        prompt = f"""You are a Salesforce testing expert. Create a comprehensive test preparation plan to challenge an AI agent's capabilities.
-
-**Current Org State:**
-{json.dumps(org_context, indent=2)}
+PREPARATION_TASK = """Create a comprehensive test preparation plan to challenge an AI agent's capabilities, based on the org described in the context above.
 
 **Your Task:**
 Generate a detailed test preparation plan with specific, actionable steps to create challenging test scenarios. Include:
@@ -89,21 +42,39 @@ For each challenge category, provide:
 - Why this tests a specific capability
 
 Format as JSON:
-{{
+{
   "tasks": [
-    {{
+    {
       "category": "CATEGORY_NAME",
       "action": "brief description",
       "purpose": "why this is important",
       "manual_steps": ["step 1", "step 2"],
       "test_prompts": ["prompt 1", "prompt 2"],
       "verification": ["what to check"]
-    }}
+    }
   ]
-}}
+}
 
 Return ONLY the JSON, no additional text."""
 
+class ClaudeTestPreparer:
+    def __init__(self, metadata_file: str = 'org_metadata_claude.json',
+                 anthropic_api_key: str = None):
+        """Load metadata and initialize Claude"""
+        self.metadata = load_json(metadata_file)
+        
+        api_key = anthropic_api_key or os.getenv("ANTHROPIC_API_KEY")
+        self.claude = Anthropic(api_key=api_key)
+        self.model_id = os.getenv("ANTHROPIC_MODEL", "claude-3-opus-20240229")
+    
+    def generate_preparation_plan_with_claude(self):
+        """Use Claude to generate comprehensive test preparation plan"""
+        print("\n🤖 Generating test preparation plan with Claude AI...")
+        
+        # The org context is the shared, cached prefix; only the planning ask
+        # is specific to this call.
+        system_blocks = build_cached_org_context_blocks(self.metadata)
+
         try:
             print("   Calling Claude API...")
             
@@ -111,24 +82,27 @@ Return ONLY the JSON, no additional text."""
                 model=self.model_id,
                 max_tokens=4096,
                 temperature=0.4,
+                system=system_blocks,
                 messages=[
-                    {"role": "user", "content": prompt}
-                ]
+                    {"role": "user", "content": PREPARATION_TASK}
+                ],
+                extra_headers=PROMPT_CACHING_HEADERS
             )
 
-            response_text = extract_text_from_blocks(message.content)
+            response_text = extract_text_from_blocks(message.content, separator="\n")
 
             # Extract JSON
-            import re
-            json_match = re.search(r'\{[\s\S]*\}', response_text)
-            if json_match:
-                plan = json.loads(json_match.group())
+            json_text = extract_json_block(response_text)
+            if json_text:
+                plan = parse_json(json_text)
                 plan['generation_timestamp'] = utc_now_iso()
                 plan['model'] = message.model
                 usage = getattr(message, 'usage', None)
                 plan['tokens_used'] = {
                     'input': getattr(usage, 'input_tokens', None),
-                    'output': getattr(usage, 'output_tokens', None)
+                    'output': getattr(usage, 'output_tokens', None),
+                    'cache_creation': getattr(usage, 'cache_creation_input_tokens', None),
+                    'cache_read': getattr(usage, 'cache_read_input_tokens', None)
                 }
 
                 print(f"   ✅ Generated {len(plan.get('tasks', []))} test preparation tasks")
@@ -153,8 +127,7 @@ Return ONLY the JSON, no additional text."""
     
     def save_preparation_plan(self, plan: dict, filename: str = 'test_preparation_plan_claude.json'):
         """Save preparation plan"""
-        with open(filename, 'w') as f:
-            json.dump(plan, f, indent=2)
+        save_json(plan, filename)
         print(f"💾 Test preparation plan saved to {filename}")
     
     def print_preparation_plan(self, plan: dict):
@@ -6,85 +6,23 @@ Analyzes org metadata and generates context-aware test prompts
 
 import json
 import os
-from typing import List, Dict, Any
-from datetime import datetime, timezone
+from collections import defaultdict
 from anthropic import Anthropic
 from dotenv import load_dotenv
 
+from claude_common import (
+    PROMPT_CACHING_HEADERS,
+    build_cached_org_context_blocks,
+    extract_json_block,
+    load_json,
+    parse_json,
+    utc_now_iso
+)
+
 # Load environment variables from .env file
 load_dotenv()
 
-def utc_now_iso() -> str:
-    """Return current UTC timestamp as ISO string."""
-    return datetime.now(timezone.utc).isoformat()
-
-class ClaudePromptGenerator:
-    def __init__(self, metadata_file: str = 'org_metadata_claude.json', 
-                 anthropic_api_key: str = None):
-        """Load metadata and initialize Claude"""
-        with open(metadata_file, 'r') as f:
-            self.metadata = json.load(f)
-        
-        api_key = anthropic_api_key or os.getenv("ANTHROPIC_API_KEY")
-        self.claude = Anthropic(api_key=api_key)
-        
-        self.prompts = []
-    
-    def generate_prompts_with_claude(self):
-        """Use Claude to generate context-aware prompts"""
-        print("\n🤖 Generating test prompts with Claude AI...")
-
-        # Prepare context for Claude
-        custom_objects = [
-            {'name': name, 'label': obj['label']}
-            for name, obj in self.metadata['objects'].items()
-            if obj.get('custom')
-        ]
-
-        # Find financial fields
-        financial_fields = {}
-        for obj_name, obj_data in self.metadata['objects'].items():
-            fields = [
-                f['name'] for f in obj_data.get('fields', [])
-                if any(kw in f['name'].lower() or kw in f['label'].lower()
-                      for kw in ['commission', 'premium', 'amount', 'policy'])
-            ]
-            if fields:
-                financial_fields[obj_name] = fields[:3]
-
-        # Get actual sample data from org
-        sample_data = self.metadata.get('sample_data', {})
-        sample_accounts = [acc['Name'] for acc in sample_data.get('accounts', [])]
-        sample_opportunities = [opp['Name'] for opp in sample_data.get('opportunities', [])]
-
-        # Get custom object sample data
-        custom_object_samples = {}
-        for obj_name in [name for name, obj in self.metadata['objects'].items() if obj.get('custom')][:5]:
-            if obj_name in sample_data:
-                custom_object_samples[obj_name] = [rec.get('Name') for rec in sample_data[obj_name] if rec.get('Name')]
-
-        context = {
-            'custom_objects': custom_objects[:10],
-            'financial_fields': financial_fields,
-            'sample_accounts': sample_accounts[:10] if sample_accounts else ["[No accounts found in org]"],
-            'sample_opportunities': sample_opportunities[:10] if sample_opportunities else ["[No opportunities found]"],
-            'custom_object_samples': custom_object_samples,
-            'total_flows': len(self.metadata['flows']),
-            'inactive_flows': [
-                f['ApiName'] for f in self.metadata['flows']
-                if not f.get('IsActive')
-            ][:5],
-            'reports': [
-                {'name': r['Name'], 'folder': r.get('FolderName')}
-                for r in self.metadata['reports'][:10]
-            ]
-        }
-        
-        # Create comprehensive prompt for Claude
-        prompt = f"""You are a Salesforce testing expert. Generate comprehensive test prompts for an AI agent based on this org metadata.
-
-**Org Metadata Context:**
-{json.dumps(context, indent=2)}
+GENERATION_TASK = """Generate comprehensive test prompts for an AI agent based on the org described in the context above.
 
 **Use Cases to Cover:**
 1. Show insurance policies for an account (query custom objects)
@@ -106,18 +44,37 @@ class ClaudePromptGenerator:
 - Include prompts that will challenge error handling
 - Format as JSON array with this structure:
   [
-    {{
+    {
       "use_case": "UC1",
       "prompt": "actual prompt text with real data",
       "expected_object": "ObjectName",
       "difficulty": "easy|medium|hard",
       "challenges": ["list", "of", "challenges"],
       "expected_behavior": "what agent should do"
-    }}
+    }
   ]
 
 Return ONLY the JSON array, no additional text."""
 
+class ClaudePromptGenerator:
+    def __init__(self, metadata_file: str = 'org_metadata_claude.json', 
+                 anthropic_api_key: str = None):
+        """Load metadata and initialize Claude"""
+        self.metadata = load_json(metadata_file)
+        
+        api_key = anthropic_api_key or os.getenv("ANTHROPIC_API_KEY")
+        self.claude = Anthropic(api_key=api_key)
+        
+        self.prompts = []
+    
+    def generate_prompts_with_claude(self):
+        """Use Claude to generate context-aware prompts"""
+        print("\n🤖 Generating test prompts with Claude AI...")
+
+        # The org context is the shared, cached prefix; only the prompt
+        # generation ask is specific to this call.
+        system_blocks = build_cached_org_context_blocks(self.metadata)
+
         try:
             # Call Claude with streaming for better UX
             print("   Calling Claude API...")
@@ -126,19 +83,20 @@ Return ONLY the JSON array, no additional text."""
                 model="claude-3-opus-20240229",
                 max_tokens=4096,
                 temperature=0.5,
+                system=system_blocks,
                 messages=[
-                    {"role": "user", "content": prompt}
-                ]
+                    {"role": "user", "content": GENERATION_TASK}
+                ],
+                extra_headers=PROMPT_CACHING_HEADERS
             )
             
             # Extract and parse response
             response_text = message.content[0].text
             
             # Try to extract JSON from response
-            import re
-            json_match = re.search(r'\[[\s\S]*\]', response_text)
-            if json_match:
-                prompts_json = json.loads(json_match.group())
+            json_text = extract_json_block(response_text, '[', ']')
+            if json_text:
+                prompts_json = parse_json(json_text)
                 self.prompts = prompts_json
                 print(f"   ✅ Generated {len(self.prompts)} test prompts")
             else:
@@ -173,27 +131,27 @@ Return ONLY the JSON array, no additional text."""
         print("="*70)
         
         # Group by use case
-        by_use_case = {}
+        by_use_case = defaultdict(list)
         for prompt in self.prompts:
-            uc = prompt.get('use_case', 'UNKNOWN')
-            if uc not in by_use_case:
-                by_use_case[uc] = []
-            by_use_case[uc].append(prompt)
+            by_use_case[prompt.get('use_case', 'UNKNOWN')].append(prompt)
         
-        for uc, prompts in sorted(by_use_case.items()):
+        for uc in sorted(by_use_case):
             print(f"\n{'='*70}")
             print(f"{uc}")
             print(f"{'='*70}")
             
-            for i, prompt in enumerate(prompts, 1):
+            for i, prompt in enumerate(by_use_case[uc], 1):
                 print(f"\n[{i}] {prompt.get('difficulty', 'unknown').upper()}")
                 print(f"    Prompt: \"{prompt['prompt']}\"")
-                if 'expected_object' in prompt:
-                    print(f"    Expected Object: {prompt['expected_object']}")
-                if 'challenges' in prompt:
-                    print(f"    Challenges: {', '.join(prompt['challenges'])}")
-                if 'expected_behavior' in prompt:
-                    print(f"    Expected: {prompt['expected_behavior']}")
+                expected_object = prompt.get('expected_object')
+                if expected_object is not None:
+                    print(f"    Expected Object: {expected_object}")
+                challenges = prompt.get('challenges')
+                if challenges is not None:
+                    print(f"    Challenges: {', '.join(challenges)}")
+                expected_behavior = prompt.get('expected_behavior')
+                if expected_behavior is not None:
+                    print(f"    Expected: {expected_behavior}")
 
 
 def main():
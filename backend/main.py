@@ -3,12 +3,14 @@ FastAPI Backend for Salesforce Test Prompt Generator
 Modular web application with multi-step workflow
 """
 
-import json
-from fastapi import FastAPI, HTTPException, Response
+import asyncio
+import orjson
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from typing import Dict, Any
-import io
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Any, Tuple
 
 from models import (
     ExtractMetadataRequest,
@@ -16,29 +18,43 @@ from models import (
     UseCaseItem,
     GeneratePromptsRequest,
     GeneratePromptsResponse,
-    ErrorResponse,
-    TestPrompt
+    ErrorResponse
 )
+from services._anthropic_client import get_anthropic_client, get_async_anthropic_client
 from services.metadata_extractor import SalesforceMetadataExtractor
 from services.test_preparer import ClaudeTestPreparer
 from services.prompt_generator import ClaudePromptGenerator
 from utils import (
     generate_session_id,
     store_session_data,
+    update_session_data,
     get_session_data,
     delete_session_data,
-    convert_prompts_to_csv,
+    extraction_cache_key,
+    get_cached_extraction,
+    store_cached_extraction,
+    iter_json_object,
+    iter_prompts_csv,
     convert_test_plan_to_csv,
     convert_metadata_to_csv,
+    precompute_metadata_summary,
     utc_now_iso
 )
 
 app = FastAPI(
     title="Salesforce Test Prompt Generator",
     description="Generate context-aware test prompts for Salesforce organizations",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# Upper bound on concurrent Claude calls per step-2 request (Anthropic rate limits)
+CLAUDE_MAX_CONCURRENCY = 5
+
+# JSON file downloads are streamed, pretty-printed as before; non-JSON values
+# (e.g. dates) fall back to str
+DOWNLOAD_JSON_OPTIONS = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC
+
 # CORS middleware for React frontend
 app.add_middleware(
     CORSMiddleware,
@@ -48,8 +64,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses (mainly the JSON/CSV downloads)
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
 
-@app.get("/")
+
+@app.get("/", response_class=ORJSONResponse)
 async def root():
     """Health check endpoint"""
     return {
@@ -59,7 +78,7 @@ async def root():
     }
 
 
-@app.post("/api/step1-extract", response_model=UseCaseListResponse)
+@app.post("/api/step1-extract", response_model=UseCaseListResponse, response_class=ORJSONResponse)
 async def step1_extract_metadata(request: ExtractMetadataRequest):
     """
     Step 1: Extract Salesforce metadata and identify use cases
@@ -69,17 +88,37 @@ async def step1_extract_metadata(request: ExtractMetadataRequest):
         # Generate session ID
         session_id = generate_session_id()
 
-        # Extract metadata
-        extractor = SalesforceMetadataExtractor(
-            username=request.credentials.username,
-            password=request.credentials.password,
-            security_token=request.credentials.security_token,
-            anthropic_api_key=request.credentials.anthropic_api_key,
-            domain=request.credentials.domain
+        # Reuse a recent extraction of the same org (e.g. a retry)
+        cache_key = extraction_cache_key(
+            request.credentials.username,
+            request.credentials.password,
+            request.credentials.security_token,
+            request.credentials.domain,
+            request.use_case_description
         )
+        metadata = get_cached_extraction(cache_key)
+
+        if metadata is None:
+            # Extract metadata
+            extractor = SalesforceMetadataExtractor(
+                username=request.credentials.username,
+                password=request.credentials.password,
+                security_token=request.credentials.security_token,
+                anthropic_api_key=request.credentials.anthropic_api_key,
+                domain=request.credentials.domain,
+                anthropic_client=get_anthropic_client(request.credentials.anthropic_api_key)
+            )
 
-        metadata = extractor.extract_all(use_case_context=request.use_case_description)
-        extractor.close()
+            # Salesforce calls are issued concurrently on the event loop; the
+            # blocking login and Claude analysis run in worker threads
+            try:
+                metadata = await extractor.extract_all_async(
+                    use_case_context=request.use_case_description
+                )
+            finally:
+                # Release the Salesforce session and pool even if extraction failed
+                await run_in_threadpool(extractor.close)
+            store_cached_extraction(cache_key, metadata)
 
         # Use Claude to identify and categorize use cases
         # Parse the use case description and create structured use cases
@@ -89,9 +128,13 @@ async def step1_extract_metadata(request: ExtractMetadataRequest):
             request.credentials.anthropic_api_key
         )
 
+        # Summarize once; downloads reuse this instead of rescanning objects
+        summary = precompute_metadata_summary(metadata)
+
         # Store metadata and use cases in session
-        store_session_data(session_id, {
+        await run_in_threadpool(store_session_data, session_id, {
             'metadata': metadata,
+            'precomputed_summary': summary,
             'use_case_description': request.use_case_description,
             'use_cases': [uc.dict() for uc in use_cases],
             'anthropic_api_key': request.credentials.anthropic_api_key,
@@ -100,12 +143,12 @@ async def step1_extract_metadata(request: ExtractMetadataRequest):
 
         # Create metadata summary
         metadata_summary = {
-            'org_name': metadata.get('org_info', {}).get('Name', ''),
-            'org_type': metadata.get('org_info', {}).get('OrganizationType', ''),
-            'is_sandbox': metadata.get('org_info', {}).get('IsSandbox', False),
-            'custom_objects': len([o for o in metadata.get('objects', {}).values() if o.get('custom')]),
-            'total_flows': len(metadata.get('flows', [])),
-            'total_reports': len(metadata.get('reports', []))
+            'org_name': summary['org_name'],
+            'org_type': summary['org_type'],
+            'is_sandbox': summary['is_sandbox'],
+            'custom_objects': len(summary['custom_object_names']),
+            'total_flows': summary['total_flows'],
+            'total_reports': summary['total_reports']
         }
 
         return UseCaseListResponse(
@@ -118,14 +161,19 @@ async def step1_extract_metadata(request: ExtractMetadataRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.post("/api/step2-generate-prompts", response_model=GeneratePromptsResponse)
+@app.post(
+    "/api/step2-generate-prompts",
+    response_model=None,
+    response_class=ORJSONResponse,
+    responses={200: {"model": GeneratePromptsResponse}}
+)
 async def step2_generate_prompts(request: GeneratePromptsRequest):
     """
     Step 2: Generate prompts based on user-specified counts for each use case
     """
     try:
         # Retrieve session data
-        session_data = get_session_data(request.session_id)
+        session_data = await run_in_threadpool(get_session_data, request.session_id)
         if not session_data:
             raise HTTPException(status_code=404, detail="Session not found")
 
@@ -137,15 +185,26 @@ async def step2_generate_prompts(request: GeneratePromptsRequest):
         all_prompts = []
         total_tokens = {'input': 0, 'output': 0}
 
-        for use_case in request.use_cases:
-            # Generate prompts for this specific use case
-            prompts = await generate_prompts_for_use_case(
-                metadata=metadata,
-                use_case=use_case,
-                anthropic_api_key=anthropic_api_key,
-                use_case_description=use_case_description
-            )
-
+        # Each use case is an independent Claude round trip, so fan them out
+        # concurrently (bounded) instead of awaiting them one by one
+        semaphore = asyncio.Semaphore(CLAUDE_MAX_CONCURRENCY)
+        summary = session_data.get('precomputed_summary')
+        if not summary or 'sample_account_names' not in summary:
+            summary = precompute_metadata_summary(metadata)
+        shared_context_json = build_shared_prompt_context(summary)
+
+        async def generate(use_case: UseCaseItem) -> Dict[str, Any]:
+            async with semaphore:
+                return await generate_prompts_for_use_case(
+                    shared_context_json=shared_context_json,
+                    use_case=use_case,
+                    anthropic_api_key=anthropic_api_key,
+                    use_case_description=use_case_description
+                )
+
+        results = await asyncio.gather(*(generate(uc) for uc in request.use_cases))
+
+        for prompts in results:
             # Add to total
             all_prompts.extend(prompts['prompts'])
             if 'tokens_used' in prompts:
@@ -153,30 +212,36 @@ async def step2_generate_prompts(request: GeneratePromptsRequest):
                 total_tokens['output'] += prompts['tokens_used'].get('output', 0)
 
         # Store generated prompts in session
-        session_data['generated_prompts'] = all_prompts
-        session_data['generation_timestamp'] = utc_now_iso()
-        store_session_data(request.session_id, session_data)
-
-        # Convert to TestPrompt models
-        test_prompts = [TestPrompt(**prompt) for prompt in all_prompts]
-
-        return GeneratePromptsResponse(
-            session_id=request.session_id,
-            total_prompts=len(test_prompts),
-            prompts=test_prompts,
-            generation_timestamp=utc_now_iso(),
-            model="claude-3-5-sonnet-20241022",
-            tokens_used=total_tokens
-        )
+        # Only the new fields are written; the stored metadata is untouched.
+        # If the session expired meanwhile nothing is written, but the
+        # prompts are still returned below
+        await run_in_threadpool(update_session_data, request.session_id, {
+            'generated_prompts': all_prompts,
+            'generation_timestamp': utc_now_iso()
+        })
+
+        # Returned as a plain dict: the prompts are already parsed JSON, so
+        # skip the Pydantic validate/re-serialize round trip. The OpenAPI
+        # schema still documents GeneratePromptsResponse.
+        return {
+            'session_id': request.session_id,
+            'total_prompts': len(all_prompts),
+            'prompts': all_prompts,
+            'generation_timestamp': utc_now_iso(),
+            'model': "claude-3-5-sonnet-20241022",
+            'tokens_used': total_tokens
+        }
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/api/download/{session_id}/{format}")
-async def download_results(session_id: str, format: str):
+async def download_results(session_id: str, format: str, background_tasks: BackgroundTasks,
+                           cleanup: bool = False):
     """
     Step 3: Download results in specified format (json or csv)
+    With ?cleanup=true the session is deleted once the response has been sent
     """
     try:
         # Validate format
@@ -184,22 +249,27 @@ async def download_results(session_id: str, format: str):
             raise HTTPException(status_code=400, detail="Format must be 'json' or 'csv'")
 
         # Retrieve session data
-        session_data = get_session_data(session_id)
+        session_data = await run_in_threadpool(get_session_data, session_id)
         if not session_data:
             raise HTTPException(status_code=404, detail="Session not found")
 
         prompts = session_data.get('generated_prompts', [])
         metadata = session_data.get('metadata', {})
 
+        if cleanup:
+            background_tasks.add_task(delete_session_data, session_id)
+
         if format == 'json':
+            summary = session_data.get('precomputed_summary') or precompute_metadata_summary(metadata)
+
             # Return JSON with all data
             output = {
                 'metadata_summary': {
                     'org_info': metadata.get('org_info', {}),
                     'extraction_timestamp': metadata.get('extraction_timestamp'),
-                    'custom_objects': [name for name, obj in metadata.get('objects', {}).items() if obj.get('custom')],
-                    'total_flows': len(metadata.get('flows', [])),
-                    'total_reports': len(metadata.get('reports', []))
+                    'custom_objects': summary['custom_object_names'],
+                    'total_flows': summary['total_flows'],
+                    'total_reports': summary['total_reports']
                 },
                 'claude_analysis': metadata.get('claude_analysis', {}),
                 'test_prompts': prompts,
@@ -207,8 +277,8 @@ async def download_results(session_id: str, format: str):
                 'total_prompts': len(prompts)
             }
 
-            return Response(
-                content=json.dumps(output, indent=2, default=str),
+            return StreamingResponse(
+                iter_json_object(output, stream_keys=('test_prompts',), option=DOWNLOAD_JSON_OPTIONS),
                 media_type="application/json",
                 headers={
                     "Content-Disposition": f"attachment; filename=test_prompts_{session_id[:8]}.json"
@@ -216,10 +286,8 @@ async def download_results(session_id: str, format: str):
             )
 
         else:  # CSV format
-            csv_content = convert_prompts_to_csv(prompts)
-
             return StreamingResponse(
-                io.StringIO(csv_content),
+                iter_prompts_csv(prompts),
                 media_type="text/csv",
                 headers={
                     "Content-Disposition": f"attachment; filename=test_prompts_{session_id[:8]}.csv"
@@ -231,32 +299,41 @@ async def download_results(session_id: str, format: str):
 
 
 @app.get("/api/download-metadata/{session_id}/{format}")
-async def download_metadata(session_id: str, format: str):
+async def download_metadata(session_id: str, format: str, background_tasks: BackgroundTasks,
+                            cleanup: bool = False):
     """
     Download full metadata in specified format
+    With ?cleanup=true the session is deleted once the response has been sent
     """
     try:
         if format not in ['json', 'csv']:
             raise HTTPException(status_code=400, detail="Format must be 'json' or 'csv'")
 
-        session_data = get_session_data(session_id)
+        session_data = await run_in_threadpool(get_session_data, session_id)
         if not session_data:
             raise HTTPException(status_code=404, detail="Session not found")
 
         metadata = session_data.get('metadata', {})
 
+        if cleanup:
+            background_tasks.add_task(delete_session_data, session_id)
+
         if format == 'json':
-            return Response(
-                content=json.dumps(metadata, indent=2, default=str),
+            return StreamingResponse(
+                iter_json_object(metadata, option=DOWNLOAD_JSON_OPTIONS),
                 media_type="application/json",
                 headers={
                     "Content-Disposition": f"attachment; filename=metadata_{session_id[:8]}.json"
                 }
             )
         else:  # CSV
-            csv_content = convert_metadata_to_csv(metadata)
-            return StreamingResponse(
-                io.StringIO(csv_content),
+            summary = session_data.get('precomputed_summary')
+            csv_content = convert_metadata_to_csv(
+                metadata,
+                custom_object_names=summary['custom_object_names'] if summary else None
+            )
+            return Response(
+                content=csv_content,
                 media_type="text/csv",
                 headers={
                     "Content-Disposition": f"attachment; filename=metadata_{session_id[:8]}.csv"
@@ -267,13 +344,13 @@ async def download_metadata(session_id: str, format: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@app.delete("/api/cleanup/{session_id}")
+@app.delete("/api/cleanup/{session_id}", response_class=ORJSONResponse)
 async def cleanup_session(session_id: str):
     """
     Cleanup session data (call this after download to free memory)
     """
     try:
-        delete_session_data(session_id)
+        await run_in_threadpool(delete_session_data, session_id)
         return {"status": "success", "message": "Session cleaned up"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -281,6 +358,43 @@ async def cleanup_session(session_id: str):
 
 # Helper functions
 
+def parse_json_array(response_text: str):
+    """
+    Parse the JSON array in a Claude reply. Most replies are the bare array,
+    so try that first and only fall back to slicing out the brackets when it fails.
+    Returns None if no array can be found.
+    """
+    try:
+        result = orjson.loads(response_text)
+        if isinstance(result, list):
+            return result
+    except orjson.JSONDecodeError:
+        pass
+
+    # Slice from the first '[' to the last ']': linear, no regex backtracking
+    start = response_text.find('[')
+    end = response_text.rfind(']') + 1
+    if start == -1 or end <= start:
+        return None
+    try:
+        result = orjson.loads(response_text[start:end])
+    except orjson.JSONDecodeError:
+        return None
+    return result if isinstance(result, list) else None
+
+
+async def stream_claude_text(claude, **kwargs) -> Tuple[str, Any]:
+    """
+    Stream a Claude message, returning the assembled text and the final message
+    (for usage totals). Text is consumed as it arrives rather than after the
+    whole response has been buffered server-side.
+    """
+    async with claude.messages.stream(**kwargs) as stream:
+        text_parts = [text async for text in stream.text_stream]
+        message = await stream.get_final_message()
+    return "".join(text_parts), message
+
+
 async def identify_use_cases(
     metadata: Dict[str, Any],
     use_case_description: str,
@@ -289,10 +403,7 @@ async def identify_use_cases(
     """
     Use Claude to identify and structure use cases from description
     """
-    from anthropic import Anthropic
-    import re
-
-    claude = Anthropic(api_key=anthropic_api_key)
+    claude = get_async_anthropic_client(anthropic_api_key)
 
     # Get custom objects for context
     custom_objects = [
@@ -307,8 +418,8 @@ async def identify_use_cases(
 {use_case_description}
 
 **Org Context:**
-- Custom Objects: {json.dumps(custom_objects[:10], indent=2)}
-- Total Flows: {len(metadata.get('flows', []))}
+- Custom Objects: {orjson.dumps(custom_objects[:10]).decode()}
+- Total Flows: {metadata.get('flows', {}).get('total', 0)}
 - Total Reports: {len(metadata.get('reports', []))}
 
 **Your Task:**
@@ -328,19 +439,17 @@ Return ONLY a JSON array with this structure:
 Return ONLY the JSON array, no additional text."""
 
     try:
-        message = claude.messages.create(
+        response_text, message = await stream_claude_text(
+            claude,
             model="claude-3-5-sonnet-20241022",
             max_tokens=2048,
             temperature=0.3,
             messages=[{"role": "user", "content": prompt}]
         )
 
-        response_text = message.content[0].text
-
         # Extract JSON
-        json_match = re.search(r'\[[\s\S]*\]', response_text)
-        if json_match:
-            use_cases_data = json.loads(json_match.group())
+        use_cases_data = parse_json_array(response_text)
+        if use_cases_data is not None:
             return [UseCaseItem(**uc) for uc in use_cases_data]
         else:
             # Fallback to default use cases
@@ -351,8 +460,20 @@ Return ONLY the JSON array, no additional text."""
         return get_default_use_cases()
 
 
+def build_shared_prompt_context(summary: Dict[str, Any]) -> str:
+    """
+    Serialize the part of the prompt context that is identical for every use
+    case, once per step-2 request, from the session's precomputed summary
+    """
+    return orjson.dumps({
+        'sample_accounts': summary['sample_account_names'][:5],
+        'sample_opportunities': summary['sample_opportunity_names'][:5],
+        'custom_objects': summary['custom_object_names'][:5]
+    }).decode()
+
+
 async def generate_prompts_for_use_case(
-    metadata: Dict[str, Any],
+    shared_context_json: str,
     use_case: UseCaseItem,
     anthropic_api_key: str,
     use_case_description: str
@@ -360,25 +481,13 @@ async def generate_prompts_for_use_case(
     """
     Generate specific number of prompts for a single use case
     """
-    from anthropic import Anthropic
-    import re
-
-    claude = Anthropic(api_key=anthropic_api_key)
-
-    # Get sample data
-    sample_data = metadata.get('sample_data', {})
-    sample_accounts = [acc['Name'] for acc in sample_data.get('accounts', [])]
-    sample_opportunities = [opp['Name'] for opp in sample_data.get('opportunities', [])]
+    claude = get_async_anthropic_client(anthropic_api_key)
 
-    # Get custom objects
-    custom_objects = [name for name, obj in metadata['objects'].items() if obj.get('custom')]
-
-    context = {
-        'use_case': use_case.dict(),
-        'sample_accounts': sample_accounts[:5],
-        'sample_opportunities': sample_opportunities[:5],
-        'custom_objects': custom_objects[:5]
-    }
+    # Splice the per-use-case entry into the pre-serialized shared context
+    context_json = (
+        '{"use_case":' + orjson.dumps(use_case.dict()).decode()
+        + ',' + shared_context_json[1:]
+    )
 
     prompt = f"""Generate exactly {use_case.prompt_count} test prompts for this specific use case:
 
@@ -387,7 +496,7 @@ async def generate_prompts_for_use_case(
 - Description: {use_case.description}
 
 **Context:**
-{json.dumps(context, indent=2)}
+{context_json}
 
 **Requirements:**
 - Generate EXACTLY {use_case.prompt_count} prompts
@@ -410,19 +519,17 @@ Return ONLY a JSON array:
 Return ONLY the JSON array, no additional text."""
 
     try:
-        message = claude.messages.create(
+        response_text, message = await stream_claude_text(
+            claude,
             model="claude-3-5-sonnet-20241022",
             max_tokens=2048,
             temperature=0.5,
             messages=[{"role": "user", "content": prompt}]
         )
 
-        response_text = message.content[0].text
-
         # Extract JSON
-        json_match = re.search(r'\[[\s\S]*\]', response_text)
-        if json_match:
-            prompts = json.loads(json_match.group())
+        prompts = parse_json_array(response_text)
+        if prompts is not None:
             return {
                 'prompts': prompts,
                 'tokens_used': {
@@ -437,49 +544,67 @@ Return ONLY the JSON array, no additional text."""
         return {'prompts': [], 'tokens_used': {'input': 0, 'output': 0}, 'error': str(e)}
 
 
+# Fallback use cases, built once at import
+_DEFAULT_USE_CASES = [
+    UseCaseItem(
+        id="uc1",
+        name="Query Records",
+        description="Test querying records from custom objects",
+        default_prompt_count=3,
+        prompt_count=3
+    ),
+    UseCaseItem(
+        id="uc2",
+        name="Create Records",
+        description="Test creating new records with validation",
+        default_prompt_count=3,
+        prompt_count=3
+    ),
+    UseCaseItem(
+        id="uc3",
+        name="Update Records",
+        description="Test updating existing records",
+        default_prompt_count=3,
+        prompt_count=3
+    ),
+    UseCaseItem(
+        id="uc4",
+        name="Calculate Aggregations",
+        description="Test calculating sums, averages, and aggregations",
+        default_prompt_count=3,
+        prompt_count=3
+    ),
+    UseCaseItem(
+        id="uc5",
+        name="Generate Reports",
+        description="Test generating custom reports",
+        default_prompt_count=3,
+        prompt_count=3
+    )
+]
+
+
 def get_default_use_cases() -> list[UseCaseItem]:
     """
     Fallback default use cases
     """
-    return [
-        UseCaseItem(
-            id="uc1",
-            name="Query Records",
-            description="Test querying records from custom objects",
-            default_prompt_count=3,
-            prompt_count=3
-        ),
-        UseCaseItem(
-            id="uc2",
-            name="Create Records",
-            description="Test creating new records with validation",
-            default_prompt_count=3,
-            prompt_count=3
-        ),
-        UseCaseItem(
-            id="uc3",
-            name="Update Records",
-            description="Test updating existing records",
-            default_prompt_count=3,
-            prompt_count=3
-        ),
-        UseCaseItem(
-            id="uc4",
-            name="Calculate Aggregations",
-            description="Test calculating sums, averages, and aggregations",
-            default_prompt_count=3,
-            prompt_count=3
-        ),
-        UseCaseItem(
-            id="uc5",
-            name="Generate Reports",
-            description="Test generating custom reports",
-            default_prompt_count=3,
-            prompt_count=3
-        )
-    ]
+    return [uc.model_copy() for uc in _DEFAULT_USE_CASES]
 
 
 if __name__ == "__main__":
+    import os
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+
+    # Multiple workers only share sessions through Redis, so stay on a
+    # single worker with the in-memory store unless told otherwise
+    default_workers = min(4, os.cpu_count() or 1) if os.getenv("REDIS_URL") else 1
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8000,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.getenv("WEB_CONCURRENCY", default_workers)),
+        log_level="warning",
+        access_log=False
+    )
@@ -0,0 +1,58 @@
+"""
+Shared Anthropic clients for the Claude-backed services and the API handlers
+One sync and one async client per API key, so back-to-back calls reuse their
+connection pools. Clients are kept in a small LRU keyed by a digest of the
+API key, so raw keys are never held as cache keys and the number of pools
+stays bounded.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Tuple
+
+import httpx
+from anthropic import Anthropic, AsyncAnthropic
+
+# Most recently used (API key, sync/async) clients kept per process
+MAX_CLIENTS = 32
+
+_CLIENTS: "OrderedDict[Tuple[bytes, bool], Any]" = OrderedDict()
+_CLIENTS_LOCK = threading.Lock()
+
+
+def _get_client(anthropic_api_key: str, is_async: bool):
+    key = (hashlib.blake2b(anthropic_api_key.encode('utf-8'), digest_size=16).digest(), is_async)
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is not None:
+            _CLIENTS.move_to_end(key)
+            return client
+
+        if is_async:
+            client = AsyncAnthropic(
+                api_key=anthropic_api_key,
+                max_retries=2,
+                timeout=60.0,
+                http_client=httpx.AsyncClient(
+                    limits=httpx.Limits(max_keepalive_connections=20, max_connections=50)
+                )
+            )
+        else:
+            client = Anthropic(api_key=anthropic_api_key)
+        _CLIENTS[key] = client
+        # Evicted clients may still be mid-request, so they are dropped rather
+        # than closed; their pools are released once the last caller is done
+        while len(_CLIENTS) > MAX_CLIENTS:
+            _CLIENTS.popitem(last=False)
+        return client
+
+
+def get_anthropic_client(anthropic_api_key: str) -> Anthropic:
+    """Return the shared Anthropic client for this API key, creating it on first use"""
+    return _get_client(anthropic_api_key, is_async=False)
+
+
+def get_async_anthropic_client(anthropic_api_key: str) -> AsyncAnthropic:
+    """Return the shared AsyncAnthropic client for this API key, creating it on first use"""
+    return _get_client(anthropic_api_key, is_async=True)
@@ -0,0 +1,82 @@
+"""
+Cache of Claude results
+Entries are keyed by a hash of the full request (model, sampling settings
+and content blocks) keyed with the caller's API key, so an identical request
+from the same tenant within the TTL is answered without calling the API.
+Entries live in Redis when REDIS_URL is set, otherwise in private files
+under CACHE_DIR.
+"""
+
+import hashlib
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import orjson
+
+from ._disk_cache import sweep_expired, write_private
+
+CACHE_DIR = Path.home() / '.clientell' / 'cache' / 'claude'
+
+# How long a cached Claude result is served for an identical request
+CACHE_TTL_SECONDS = 3600
+
+_REDIS_URL = os.getenv("REDIS_URL")
+_redis_client = None
+
+# Same optional-dependency handling as the session store in utils
+if _REDIS_URL:
+    try:
+        import redis
+    except ImportError:  # redis is optional; results are cached on disk
+        pass
+    else:
+        _redis_client = redis.Redis.from_url(_REDIS_URL)
+
+
+def request_key(request: Dict[str, Any], anthropic_api_key: str) -> str:
+    """
+    Hash a messages request into a cache key. The hash is keyed with a
+    digest of the API key, so tenants never share cached results.
+    """
+    tenant = hashlib.blake2b(anthropic_api_key.encode('utf-8')).digest()
+    return hashlib.blake2b(
+        orjson.dumps(request, option=orjson.OPT_SORT_KEYS), key=tenant, digest_size=16
+    ).hexdigest()
+
+
+def get(key: str) -> Optional[Any]:
+    """Return the cached result for a request key, or None if missing or expired"""
+    if _redis_client is not None:
+        try:
+            raw = _redis_client.get(f"claude:{key}")
+        except redis.RedisError:
+            return None
+        return orjson.loads(raw) if raw is not None else None
+
+    path = CACHE_DIR / f"{key}.json"
+    try:
+        if time.time() - path.stat().st_mtime > CACHE_TTL_SECONDS:
+            path.unlink()
+            return None
+        return orjson.loads(path.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+
+
+def put(key: str, result: Any):
+    """Store a result for a request key"""
+    if _redis_client is not None:
+        try:
+            _redis_client.set(f"claude:{key}", orjson.dumps(result), ex=CACHE_TTL_SECONDS)
+        except redis.RedisError:
+            pass
+        return
+
+    try:
+        write_private(CACHE_DIR / f"{key}.json", orjson.dumps(result))
+        sweep_expired(CACHE_DIR, CACHE_TTL_SECONDS)
+    except OSError:
+        # The cache is an optimization; a failed write only costs a new call
+        pass
@@ -0,0 +1,44 @@
+"""
+Private on-disk storage shared by the Claude and Salesforce result caches
+Directories are created 0700 and files 0600, writes are atomic, and entries
+past their TTL are swept
+"""
+
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+_last_sweep = {}
+_SWEEP_LOCK = threading.Lock()
+
+
+def write_private(path: Path, data: bytes):
+    """Atomically replace path with data, readable only by this user"""
+    path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    # A unique temp file per write, so concurrent writers of one entry never
+    # share a partial file; mkstemp creates it 0600
+    with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp', delete=False) as tmp:
+        tmp.write(data)
+    try:
+        os.replace(tmp.name, path)
+    except OSError:
+        os.unlink(tmp.name)
+        raise
+
+
+def sweep_expired(root: Path, ttl_seconds: float):
+    """Delete files under root older than ttl_seconds, at most once per TTL per root"""
+    now = time.time()
+    with _SWEEP_LOCK:
+        if now - _last_sweep.get(root, 0) < ttl_seconds:
+            return
+        _last_sweep[root] = now
+
+    for path in root.rglob('*'):
+        try:
+            if path.is_file() and now - path.stat().st_mtime > ttl_seconds:
+                path.unlink()
+        except OSError:
+            pass
@@ -0,0 +1,41 @@
+"""
+Financial-field detection shared by the Claude-backed services
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Pattern, Tuple
+
+
+def keyword_pattern(keywords: Iterable[str]) -> Pattern[str]:
+    """Compile keywords into one case-insensitive alternation"""
+    return re.compile('|'.join(map(re.escape, keywords)), re.IGNORECASE)
+
+
+def _name_and_label(field: Any) -> Tuple[str, str]:
+    """Read a field's name and label from a FieldInfo or a decoded dict"""
+    if isinstance(field, dict):
+        return field['name'], field['label']
+    return field.name, field.label
+
+
+def financial_fields_by_object(objects: Dict[str, Dict[str, Any]], pattern: Pattern[str],
+                               limit: int) -> Dict[str, List[str]]:
+    """Map each object to (at most `limit`) field names whose name or label matches pattern"""
+    search = pattern.search
+    financial_fields = {}
+    for obj_name, obj_data in objects.items():
+        fields = [
+            name for name, label in map(_name_and_label, obj_data.get('fields', []))
+            if search(name) or search(label)
+        ]
+        if fields:
+            financial_fields[obj_name] = fields[:limit]
+    return financial_fields
+
+
+# Substrings that mark a field as commission/financial data
+FINANCIAL_KEYWORDS = ('commission', 'premium', 'amount', 'value', 'policy')
+FINANCIAL_FIELD_RE = keyword_pattern(FINANCIAL_KEYWORDS)
+
+# Financial field names kept per object in the org context
+FINANCIAL_FIELDS_PER_OBJECT = 5
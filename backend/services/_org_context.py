@@ -0,0 +1,117 @@
+"""
+Org context shared by the Claude-backed services
+Every service sends the same leading blocks so Anthropic can serve the org
+context from the prompt cache on the second and later calls; only the
+task-specific instructions follow it
+"""
+
+from typing import Any, Dict, List
+
+import orjson
+
+from ._financial_fields import (
+    FINANCIAL_FIELD_RE,
+    FINANCIAL_FIELDS_PER_OBJECT,
+    financial_fields_by_object,
+)
+
+ORG_CONTEXT_PREAMBLE = """You are a Salesforce testing expert helping to evaluate an AI agent that operates on a Salesforce org.
+
+The next block is a JSON snapshot of the org under test. Always ground your answers in it:
+- Use the actual object, field, flow, and report names it contains
+- Use the actual record names from sample_accounts, sample_opportunities, and custom_object_samples
+- Never invent placeholder names when real data is available
+
+The blocks after it describe the specific artifact to produce."""
+
+# Rough input budget for the serialized org context (~4 characters per token)
+CONTEXT_TOKEN_BUDGET = 2000
+
+# Sample record names kept per custom object
+CUSTOM_OBJECT_SAMPLE_ROWS = 2
+
+# Lists that are halved, in this order, while the context is over budget
+CONTEXT_TRIM_ORDER = ('reports', 'custom_objects', 'inactive_flows', 'active_flows')
+
+
+def build_org_context(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Project extracted metadata into the org context shared by every Claude call"""
+    objects = metadata['objects']
+    flows = metadata.get('flows') or {}
+    sample_data = metadata.get('sample_data', {})
+
+    custom_object_names = metadata.get('_custom_object_names')
+    if custom_object_names is None:
+        custom_object_names = [name for name, obj in objects.items() if obj.get('custom')]
+
+    financial_fields = metadata.get('_financial_fields')
+    if financial_fields is None:
+        financial_fields = financial_fields_by_object(
+            objects, FINANCIAL_FIELD_RE, limit=FINANCIAL_FIELDS_PER_OBJECT
+        )
+
+    sample_accounts = [acc['Name'] for acc in sample_data.get('accounts', [])]
+    sample_opportunities = [opp['Name'] for opp in sample_data.get('opportunities', [])]
+
+    custom_object_samples = {}
+    for obj_name in custom_object_names[:5]:
+        if obj_name in sample_data:
+            custom_object_samples[obj_name] = [
+                rec.get('Name') for rec in sample_data[obj_name] if rec.get('Name')
+            ][:CUSTOM_OBJECT_SAMPLE_ROWS]
+
+    return {
+        'org_type': metadata['org_info'].get('OrganizationType'),
+        'is_sandbox': metadata['org_info'].get('IsSandbox'),
+        'custom_objects': [
+            {'name': name, 'label': objects[name]['label']}
+            for name in custom_object_names
+        ],
+        'financial_fields': financial_fields,
+        'total_flows': flows.get('total', 0),
+        'active_flow_count': flows.get('active_count', 0),
+        'inactive_flow_count': flows.get('inactive_count', 0),
+        'active_flows': flows.get('active', [])[:5],
+        'inactive_flows': flows.get('inactive', [])[:5],
+        'total_reports': len(metadata['reports']),
+        'reports': [
+            {'name': r['Name'], 'folder': r.get('FolderName')}
+            for r in metadata['reports'][:10]
+        ],
+        'validation_rules': len(metadata['validation_rules']),
+        'sample_accounts': sample_accounts[:10] if sample_accounts else ["[No accounts found in org]"],
+        'sample_opportunities': sample_opportunities[:10] if sample_opportunities else ["[No opportunities found]"],
+        'custom_object_samples': custom_object_samples
+    }
+
+
+def serialize_org_context(context: Dict[str, Any]) -> str:
+    """
+    Serialize the org context as compact JSON with sorted keys, dropping empty
+    sections and trimming the longest lists until it fits CONTEXT_TOKEN_BUDGET
+    """
+    context = {key: value for key, value in context.items() if value != []}
+    context_json = orjson.dumps(context, option=orjson.OPT_SORT_KEYS).decode()
+
+    for key in CONTEXT_TRIM_ORDER:
+        while len(context_json) // 4 > CONTEXT_TOKEN_BUDGET and len(context.get(key, ())) > 1:
+            context[key] = context[key][:len(context[key]) // 2]
+            context_json = orjson.dumps(context, option=orjson.OPT_SORT_KEYS).decode()
+
+    return context_json
+
+
+def build_org_context_blocks(metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Leading content blocks for every Claude call: the preamble and the org
+    context, with the cache breakpoint on the context. The same metadata
+    always yields byte-identical blocks, so later calls hit the cache.
+    """
+    return [
+        {"type": "text", "text": ORG_CONTEXT_PREAMBLE},
+        {
+            "type": "text",
+            "text": serialize_org_context(build_org_context(metadata)),
+            "cache_control": {"type": "ephemeral"}
+        }
+    ]
@@ -0,0 +1,55 @@
+"""
+On-disk cache of Salesforce fetch results
+Entries are keyed by scope (org id plus user id, so users of one org never
+share results) and fetch phase, and remember the modstamp they were fetched
+at; a lookup with a different modstamp is a miss. Files are private to
+this user and expire after CACHE_TTL_SECONDS either way.
+"""
+
+import time
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+import orjson
+
+from ._disk_cache import sweep_expired, write_private
+
+CACHE_DIR = Path.home() / '.clientell' / 'cache' / 'salesforce'
+
+# Entries older than this are deleted rather than revalidated
+CACHE_TTL_SECONDS = 24 * 3600
+
+
+def _path(scope: str, phase: str) -> Path:
+    return CACHE_DIR / scope / f"{phase}.json"
+
+
+def get_entry(scope: str, phase: str) -> Optional[Tuple[str, Any]]:
+    """Return the cached (modstamp, payload) for a phase, or None"""
+    path = _path(scope, phase)
+    try:
+        if time.time() - path.stat().st_mtime > CACHE_TTL_SECONDS:
+            path.unlink()
+            return None
+        entry = orjson.loads(path.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    return entry['modstamp'], entry['payload']
+
+
+def get(scope: str, phase: str, modstamp: str) -> Optional[Any]:
+    """Return the cached payload if it was stored with this modstamp"""
+    entry = get_entry(scope, phase)
+    if entry is None or entry[0] != modstamp:
+        return None
+    return entry[1]
+
+
+def put(scope: str, phase: str, modstamp: str, payload: Any):
+    """Store a payload, replacing any previous entry for the phase"""
+    try:
+        write_private(_path(scope, phase), orjson.dumps({'modstamp': modstamp, 'payload': payload}))
+        sweep_expired(CACHE_DIR, CACHE_TTL_SECONDS)
+    except OSError:
+        # The cache is an optimization; a failed write only costs a refetch
+        pass
@@ -3,54 +3,239 @@ Salesforce Org Metadata Extraction with Claude AI Analysis
 Modular service for web application
 """
 
-import json
+import asyncio
+import random
 from datetime import datetime, timezone
 from simple_salesforce import Salesforce
-from typing import Dict, List, Any, Iterable, Union
+from typing import AsyncIterator, Callable, Dict, List, Any, Optional, Tuple
+from email.utils import formatdate
+from urllib.parse import quote
+import httpx
 from anthropic import Anthropic
 
+from ._anthropic_client import get_anthropic_client
+from . import _claude_cache, _sf_cache
+from ._financial_fields import (
+    FINANCIAL_FIELD_RE,
+    FINANCIAL_FIELDS_PER_OBJECT,
+    financial_fields_by_object,
+)
+from ._org_context import build_org_context_blocks
+
+# Prompt caching is still behind a beta flag on the pinned SDK version
+PROMPT_CACHING_HEADERS = {"anthropic-beta": "prompt-caching-2024-07-31"}
+
+# Static part of the analysis prompt, sent right after the shared org
+# context so it can be served from Anthropic's prompt cache. The cache
+# breakpoint goes on the last static block: everything up to and including
+# it is cached.
+ANALYSIS_INSTRUCTIONS = """Analyze the Salesforce org metadata above and provide:"""
+
+ANALYSIS_SECTIONS = """1. **Org Overview**: Brief summary of the org type and key characteristics
+2. **Custom Objects Analysis**: What custom objects exist and what they might be used for
+3. **Testing Opportunities**: Specific test scenarios based on the metadata
+4. **Prompt Recommendations**: Suggest 5-10 context-aware test prompts that leverage the actual metadata
+5. **Challenge Scenarios**: Recommend specific changes to create challenging test conditions
+
+Provide your analysis in a structured format."""
+
+# Concurrent HTTP connections to Salesforce during async extraction
+SALESFORCE_MAX_CONNECTIONS = 8
+
+# Attempts per REST call while Salesforce reports its request limit exceeded
+SALESFORCE_MAX_ATTEMPTS = 5
+
+# Fraction of the daily API quota at which extraction records a warning
+SALESFORCE_API_USAGE_WARNING = 0.9
+
+# Probe for the cached report phase: the full query only reruns when the
+# row count or the newest modification time differs from the cached one. The
+# count catches deletions, which leave MAX(modstamp) alone.
+REPORT_MODSTAMP_QUERY = "SELECT COUNT(Id) total, MAX(LastModifiedDate) modstamp FROM Report"
+
+# Active and inactive flow API names kept in metadata['flows'] (alongside
+# the counts); the full flow list is never stored
+FLOW_NAMES_KEPT = 5
+
+# Global describe fields kept by store_objects (and in the describe cache)
+SOBJECT_SUMMARY_KEYS = ('name', 'queryable', 'retrieveable', 'label', 'custom', 'keyPrefix')
+
+# Business objects whose fields are always fetched (custom objects are added)
+PRIORITY_OBJECTS = [
+    'Account', 'Contact', 'Lead', 'Opportunity',
+    'User', 'Profile', 'RecordType'
+]
+
+ORG_INFO_QUERY = """
+    SELECT Id, Name, OrganizationType, InstanceName, IsSandbox,
+           TrialExpirationDate, NamespacePrefix
+    FROM Organization
+"""
+
+FLOW_QUERY = """
+    SELECT Id, ApiName, Label, ProcessType, TriggerType, RecordTriggerType,
+           IsActive, VersionNumber, Description, TriggerObjectOrEventLabel,
+           LastModifiedDate
+    FROM FlowDefinitionView
+    ORDER BY LastModifiedDate DESC
+"""
+
+REPORT_QUERY = """
+    SELECT Id, Name, Description, FolderName, Format,
+           CreatedDate, LastModifiedDate, LastRunDate,
+           CreatedBy.Name, LastModifiedBy.Name, Owner.Name
+    FROM Report
+    ORDER BY LastViewedDate DESC NULLS LAST
+    LIMIT 500
+"""
+
+VALIDATION_RULE_QUERY = """
+    SELECT Id, ValidationName, EntityDefinition.QualifiedApiName,
+           Active, Description
+    FROM ValidationRule
+    ORDER BY EntityDefinition.QualifiedApiName, ValidationName
+    LIMIT 200
+"""
+
+APEX_CLASS_QUERY = """
+    SELECT Id, Name, ApiVersion, Status, IsValid, LengthWithoutComments
+    FROM ApexClass
+    ORDER BY Name
+    LIMIT 200
+"""
+
+USER_QUERY = """
+    SELECT Id, Name, Username, Email, Profile.Name, IsActive, UserRole.Name
+    FROM User
+    WHERE IsActive = true
+    ORDER BY Name
+    LIMIT 50
+"""
+
 
 def utc_now_iso() -> str:
     """Return current UTC timestamp as ISO string."""
     return datetime.now(timezone.utc).isoformat()
 
 
-def extract_text_from_blocks(content: Iterable[Union[Dict[str, Any], Any]]) -> str:
-    """Normalize Anthropic content blocks into a single text string."""
-    text_parts: List[str] = []
+class FieldInfo:
+    """Slotted projection of a describe() field"""
+    __slots__ = ('name', 'label', 'type', 'custom', 'length', 'unique', 'nillable',
+                 'updateable', 'createable', 'picklistValues', 'referenceTo', 'relationshipName')
+
+    def __init__(self, name: str, label: str, type: str, custom: bool = False,
+                 length: Optional[int] = None, unique: Optional[bool] = None,
+                 nillable: Optional[bool] = None, updateable: Optional[bool] = None,
+                 createable: Optional[bool] = None,
+                 picklistValues: Optional[List[str]] = None,
+                 referenceTo: Optional[List[str]] = None,
+                 relationshipName: Optional[str] = None):
+        self.name = name
+        self.label = label
+        self.type = type
+        self.custom = custom
+        self.length = length
+        self.unique = unique
+        self.nillable = nillable
+        self.updateable = updateable
+        self.createable = createable
+        self.picklistValues = picklistValues
+        self.referenceTo = referenceTo
+        self.relationshipName = relationshipName
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain-dict form for JSON (unset attributes dropped); FieldInfo(**d) restores it"""
+        return {
+            key: value for key in self.__slots__
+            if (value := getattr(self, key)) is not None
+        }
+
+
+def project_field(field: Dict[str, Any]) -> FieldInfo:
+    """Keep the parts of a describe() field used downstream"""
+    field_info = FieldInfo(
+        name=field['name'],
+        label=field['label'],
+        type=field['type'],
+        custom=field.get('custom', False),
+        length=field.get('length'),
+        unique=field.get('unique'),
+        nillable=field.get('nillable'),
+        updateable=field.get('updateable'),
+        createable=field.get('createable'),
+    )
+
+    if field['type'] in ('picklist', 'multipicklist'):
+        field_info.picklistValues = [
+            pv['value'] for pv in field.get('picklistValues', [])
+        ]
+
+    if field.get('referenceTo'):
+        field_info.referenceTo = field['referenceTo']
+        field_info.relationshipName = field.get('relationshipName')
+
+    return field_info
+
+
+def is_rate_limited(response: httpx.Response) -> bool:
+    """True when Salesforce refused a call for exceeding its request limits"""
+    if response.status_code == 429:
+        return True
+    return response.status_code == 403 and b'REQUEST_LIMIT_EXCEEDED' in response.content
+
 
-    for block in content:
-        if isinstance(block, dict):
-            if block.get("type") == "text":
-                text_parts.append(block.get("text", ""))
-            continue
+def slim_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop the 'attributes' envelope Salesforce echoes on every record and relationship"""
+    return {
+        key: slim_record(value) if isinstance(value, dict) else value
+        for key, value in record.items()
+        if key != 'attributes'
+    }
 
-        block_type = getattr(block, "type", None)
-        if block_type == "text":
-            text_parts.append(getattr(block, "text", ""))
 
-    return "\n\n".join(part.strip() for part in text_parts if part)
+def sample_queries(custom_objects: List[str]) -> List[Tuple[str, str, Callable[[Dict[str, Any]], Dict[str, Any]]]]:
+    """(sample_data key, SOQL, record projection) for each sample-data query"""
+    queries = [
+        ('accounts',
+         "SELECT Id, Name FROM Account ORDER BY LastModifiedDate DESC LIMIT 10",
+         lambda r: {'Id': r['Id'], 'Name': r['Name']}),
+        ('opportunities',
+         "SELECT Id, Name, Amount, StageName FROM Opportunity ORDER BY LastModifiedDate DESC LIMIT 10",
+         lambda r: {'Id': r['Id'], 'Name': r['Name'], 'Amount': r.get('Amount'), 'StageName': r.get('StageName')}),
+    ]
+    for obj_name in custom_objects[:5]:  # Limit to first 5 custom objects
+        queries.append((
+            obj_name,
+            f"SELECT Id, Name FROM {obj_name} ORDER BY LastModifiedDate DESC LIMIT 5",
+            lambda r: {'Id': r['Id'], 'Name': r.get('Name', 'N/A')}
+        ))
+    return queries
 
 
 class SalesforceMetadataExtractor:
     def __init__(self, username: str, password: str, security_token: str,
-                 anthropic_api_key: str, domain: str = 'login', model_id: str = "claude-3-5-sonnet-20241022"):
+                 anthropic_api_key: str, domain: str = 'login', model_id: str = "claude-3-5-sonnet-20241022",
+                 anthropic_client: Optional[Anthropic] = None):
         """Initialize Salesforce connection and Claude client"""
         self.sf = None
         self.username = username
         self.password = password
         self.security_token = security_token
         self.domain = domain
+        self._api_base = None  # REST path prefix, set by extract_all_async
+        self._cache_scope = None  # Disk cache key, set by extract_all_async
+        self._sf_semaphore = None  # Bounds concurrent REST calls, set by extract_all_async
+        self._api_usage_warned = False
 
         # Initialize Claude client
-        self.claude = Anthropic(api_key=anthropic_api_key)
+        self.claude = anthropic_client or get_anthropic_client(anthropic_api_key)
         self.model_id = model_id
 
         self.metadata = {
             "extraction_timestamp": utc_now_iso(),
             "org_info": {},
             "objects": {},
-            "flows": [],
+            "flows": {},
             "reports": [],
             "validation_rules": [],
             "apex_classes": [],
@@ -74,21 +259,8 @@ class SalesforceMetadataExtractor:
         except Exception as e:
             raise Exception(f"Failed to connect to Salesforce: {str(e)}")
 
-    def fetch_org_info(self):
-        """Get basic org information"""
-        org_query = """
-            SELECT Id, Name, OrganizationType, InstanceName, IsSandbox,
-                   TrialExpirationDate, NamespacePrefix
-            FROM Organization
-        """
-        result = self.sf.query_all(org_query)
-        if result['records']:
-            self.metadata['org_info'] = result['records'][0]
-
-    def fetch_all_objects(self):
-        """Get all standard and custom objects"""
-        describe = self.sf.describe()
-
+    def store_objects(self, describe: Dict[str, Any]):
+        """Record the queryable objects from a global describe"""
         for sobject in describe['sobjects']:
             obj_name = sobject['name']
 
@@ -100,244 +272,73 @@ class SalesforceMetadataExtractor:
                     'fields': []
                 }
 
-    def fetch_object_fields(self, object_name: str):
-        """Get all fields for a specific object"""
-        try:
-            describe = getattr(self.sf, object_name).describe()
-            fields = []
-
-            for field in describe['fields']:
-                field_data = {
-                    'name': field['name'],
-                    'label': field['label'],
-                    'type': field['type'],
-                    'custom': field.get('custom', False),
-                    'length': field.get('length'),
-                    'unique': field.get('unique'),
-                    'nillable': field.get('nillable'),
-                    'updateable': field.get('updateable'),
-                    'createable': field.get('createable'),
-                }
-
-                if field['type'] in ('picklist', 'multipicklist'):
-                    field_data['picklistValues'] = [
-                        pv['value'] for pv in field.get('picklistValues', [])
-                    ]
-
-                if field.get('referenceTo'):
-                    field_data['referenceTo'] = field['referenceTo']
-                    field_data['relationshipName'] = field.get('relationshipName')
-
-                fields.append(field_data)
-
-            return fields
-        except Exception as e:
-            self.metadata['warnings'].append(f"Error fetching fields for {object_name}: {str(e)}")
-            return []
-
-    def fetch_key_object_fields(self):
-        """Fetch fields for key business objects"""
-        priority_objects = [
-            'Account', 'Contact', 'Lead', 'Opportunity',
-            'User', 'Profile', 'RecordType'
+        # Memoized once here; the fetchers and the Claude services reuse it
+        self.metadata['_custom_object_names'] = [
+            name for name, obj in self.metadata['objects'].items() if obj['custom']
         ]
 
-        custom_objects = [name for name, obj in self.metadata['objects'].items()
-                         if obj['custom']]
-
-        all_objects = priority_objects + custom_objects[:20]
-
-        for obj_name in all_objects:
-            if obj_name in self.metadata['objects']:
-                fields = self.fetch_object_fields(obj_name)
-                self.metadata['objects'][obj_name]['fields'] = fields
-
-    def fetch_flows(self):
-        """Get all flows with metadata"""
-        flow_query = """
-            SELECT Id, ApiName, Label, ProcessType, TriggerType, RecordTriggerType,
-                   IsActive, VersionNumber, Description, TriggerObjectOrEventLabel,
-                   LastModifiedDate
-            FROM FlowDefinitionView
-            ORDER BY LastModifiedDate DESC
-        """
+    def custom_object_names(self) -> List[str]:
+        """Names of the custom objects recorded by store_objects"""
+        return self.metadata.get('_custom_object_names', [])
 
-        result = self.sf.query_all(flow_query)
-        self.metadata['flows'] = result['records']
-
-    def fetch_reports(self):
-        """Get all reports"""
-        report_query = """
-            SELECT Id, Name, Description, FolderName, Format,
-                   CreatedDate, LastModifiedDate, LastRunDate,
-                   CreatedBy.Name, LastModifiedBy.Name, Owner.Name
-            FROM Report
-            ORDER BY LastViewedDate DESC NULLS LAST
-            LIMIT 500
-        """
+    def store_financial_fields(self):
+        """Memoize the financial fields once the key-object fields are in"""
+        self.metadata['_financial_fields'] = financial_fields_by_object(
+            self.metadata['objects'], FINANCIAL_FIELD_RE, limit=FINANCIAL_FIELDS_PER_OBJECT
+        )
 
-        result = self.sf.query_all(report_query)
-        self.metadata['reports'] = result['records']
-
-    def fetch_validation_rules(self):
-        """Get validation rules via Tooling API"""
-        vr_query = """
-            SELECT Id, ValidationName, EntityDefinition.QualifiedApiName,
-                   Active, Description
-            FROM ValidationRule
-            ORDER BY EntityDefinition.QualifiedApiName, ValidationName
-            LIMIT 200
-        """
-
-        try:
-            result = self.sf.toolingexecute(
-                method='GET',
-                action='query',
-                params={'q': vr_query}
-            )
-            self.metadata['validation_rules'] = result.get('records', [])
-        except Exception as e:
-            self.metadata['validation_rules'] = []
-            self.metadata['warnings'].append(
-                f"ValidationRule query failed: {str(e)}. Try the query in Developer Console or confirm Tooling API access."
-            )
+    def key_object_names(self) -> List[str]:
+        """Objects whose fields are fetched: priority objects plus the first 20 custom ones"""
+        all_objects = PRIORITY_OBJECTS + self.custom_object_names()[:20]
+        return [name for name in all_objects if name in self.metadata['objects']]
 
-    def fetch_apex_classes(self):
-        """Get Apex classes"""
-        apex_query = """
-            SELECT Id, Name, ApiVersion, Status, IsValid, LengthWithoutComments
-            FROM ApexClass
-            ORDER BY Name
-            LIMIT 200
-        """
-
-        try:
-            result = self.sf.toolingexecute(
-                method='GET',
-                action='query',
-                params={'q': apex_query}
-            )
-            self.metadata['apex_classes'] = result.get('records', [])
-        except Exception as e:
-            self.metadata['warnings'].append(f"Error fetching Apex classes: {str(e)}")
-
-    def fetch_users(self):
-        """Get active users"""
-        user_query = """
-            SELECT Id, Name, Username, Email, Profile.Name, IsActive, UserRole.Name
-            FROM User
-            WHERE IsActive = true
-            ORDER BY Name
-            LIMIT 50
-        """
-
-        result = self.sf.query_all(user_query)
-        self.metadata['users'] = result['records']
-
-    def fetch_sample_data(self):
-        """Fetch sample records for test prompt generation"""
-        sample_data = {}
-
-        # Fetch sample Accounts
-        try:
-            account_query = "SELECT Id, Name FROM Account ORDER BY LastModifiedDate DESC LIMIT 10"
-            result = self.sf.query_all(account_query)
-            sample_data['accounts'] = [{'Id': r['Id'], 'Name': r['Name']} for r in result['records']]
-        except Exception as e:
-            sample_data['accounts'] = []
-
-        # Fetch sample Opportunities
-        try:
-            opp_query = "SELECT Id, Name, Amount, StageName FROM Opportunity ORDER BY LastModifiedDate DESC LIMIT 10"
-            result = self.sf.query_all(opp_query)
-            sample_data['opportunities'] = [
-                {'Id': r['Id'], 'Name': r['Name'], 'Amount': r.get('Amount'), 'StageName': r.get('StageName')}
-                for r in result['records']
-            ]
-        except Exception as e:
-            sample_data['opportunities'] = []
-
-        # Fetch sample records from custom objects
-        custom_objects = [name for name, obj in self.metadata['objects'].items() if obj['custom']]
-
-        for obj_name in custom_objects[:5]:  # Limit to first 5 custom objects
-            try:
-                query = f"SELECT Id, Name FROM {obj_name} ORDER BY LastModifiedDate DESC LIMIT 5"
-                result = self.sf.query_all(query)
-                sample_data[obj_name] = [{'Id': r['Id'], 'Name': r.get('Name', 'N/A')} for r in result['records']]
-            except Exception as e:
-                # Skip if object has no Name field or other errors
-                pass
-
-        self.metadata['sample_data'] = sample_data
+    def record_validation_rule_failure(self, error: Exception):
+        """Record an unavailable ValidationRule query as a warning"""
+        self.metadata['validation_rules'] = []
+        self.metadata['warnings'].append(
+            f"ValidationRule query failed: {str(error)}. Try the query in Developer Console or confirm Tooling API access."
+        )
 
     def analyze_with_claude(self, use_case_context: str = None):
         """Use Claude to analyze metadata and generate insights"""
-        # Prepare metadata summary for Claude
-        metadata_summary = {
-            'org_type': self.metadata['org_info'].get('OrganizationType'),
-            'is_sandbox': self.metadata['org_info'].get('IsSandbox'),
-            'custom_objects': [
-                {'name': name, 'label': obj['label']}
-                for name, obj in self.metadata['objects'].items()
-                if obj['custom']
-            ],
-            'total_flows': len(self.metadata['flows']),
-            'active_flows': sum(1 for f in self.metadata['flows'] if f.get('IsActive')),
-            'inactive_flows': sum(1 for f in self.metadata['flows'] if not f.get('IsActive')),
-            'total_reports': len(self.metadata['reports']),
-            'validation_rules': len(self.metadata['validation_rules']),
-        }
-
-        # Find commission/financial fields
-        commission_objects = {}
-        for obj_name, obj_data in self.metadata['objects'].items():
-            commission_fields = [
-                f['name'] for f in obj_data.get('fields', [])
-                if any(kw in f['name'].lower() or kw in f['label'].lower()
-                      for kw in ['commission', 'premium', 'amount', 'value', 'policy'])
-            ]
-            if commission_fields:
-                commission_objects[obj_name] = commission_fields[:5]  # Limit to 5
-
-        metadata_summary['objects_with_financial_fields'] = commission_objects
-
-        # Create prompt for Claude
-        use_case_section = ""
+        # Create prompt for Claude: the shared org context first, then the
+        # analysis instructions (cache breakpoint on the last static block)
+        content = build_org_context_blocks(self.metadata) + [
+            {"type": "text", "text": ANALYSIS_INSTRUCTIONS},
+            {"type": "text", "text": ANALYSIS_SECTIONS, "cache_control": {"type": "ephemeral"}}
+        ]
         if use_case_context:
-            use_case_section = f"""
-**Organization-Specific Use Cases:**
+            content.append({"type": "text", "text": f"""**Organization-Specific Use Cases:**
 {use_case_context}
 
-Please incorporate these use cases into your analysis and recommendations.
-"""
-
-        prompt = f"""You are a Salesforce testing expert. Analyze this Salesforce org metadata and provide:
-
-1. **Org Overview**: Brief summary of the org type and key characteristics
-2. **Custom Objects Analysis**: What custom objects exist and what they might be used for
-3. **Testing Opportunities**: Specific test scenarios based on the metadata
-4. **Prompt Recommendations**: Suggest 5-10 context-aware test prompts that leverage the actual metadata
-5. **Challenge Scenarios**: Recommend specific changes to create challenging test conditions
+Please incorporate these use cases into your analysis and recommendations."""})
 
-{use_case_section}
-
-Metadata Summary:
-{json.dumps(metadata_summary, indent=2)}
+        request = {
+            'model': self.model_id,
+            'max_tokens': 4096,
+            'temperature': 0.3,
+            'messages': [
+                {"role": "user", "content": content}
+            ]
+        }
 
-Provide your analysis in a structured format."""
+        # An identical request within the cache TTL reuses the stored result
+        cache_key = _claude_cache.request_key(request, self.claude.api_key)
+        cached = _claude_cache.get(cache_key)
+        if cached is not None:
+            self.metadata['claude_analysis'] = cached
+            return
 
         try:
-            message = self.claude.messages.create(
-                model=self.model_id,
-                max_tokens=4096,
-                temperature=0.3,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            # Stream the reply so text is consumed as it is generated
+            with self.claude.messages.stream(
+                **request,
+                extra_headers=PROMPT_CACHING_HEADERS
+            ) as stream:
+                text_parts = [text for text in stream.text_stream]
+                message = stream.get_final_message()
 
-            analysis = extract_text_from_blocks(message.content)
+            analysis = "".join(text_parts).strip()
 
             self.metadata['claude_analysis'] = {
                 'timestamp': utc_now_iso(),
@@ -345,9 +346,13 @@ Provide your analysis in a structured format."""
                 'analysis': analysis or 'No analysis text returned by Claude.',
                 'usage': {
                     'input_tokens': getattr(message.usage, 'input_tokens', None),
-                    'output_tokens': getattr(message.usage, 'output_tokens', None)
+                    'output_tokens': getattr(message.usage, 'output_tokens', None),
+                    'cache_creation_input_tokens': getattr(message.usage, 'cache_creation_input_tokens', None),
+                    'cache_read_input_tokens': getattr(message.usage, 'cache_read_input_tokens', None)
                 }
             }
+            if analysis:
+                _claude_cache.put(cache_key, self.metadata['claude_analysis'])
 
         except Exception as e:
             suggestions = (
@@ -365,24 +370,277 @@ Provide your analysis in a structured format."""
             )
 
     def extract_all(self, use_case_context: str = None):
-        """Main extraction workflow"""
-        self.connect()
-        self.fetch_org_info()
-        self.fetch_all_objects()
-        self.fetch_key_object_fields()
-        self.fetch_flows()
-        self.fetch_reports()
-        self.fetch_validation_rules()
-        self.fetch_apex_classes()
-        self.fetch_users()
-        self.fetch_sample_data()
+        """
+        Main extraction workflow for synchronous callers (scripts, worker
+        threads): runs extract_all_async to completion on a new event loop.
+        asyncio.run raises RuntimeError inside a running loop, so async code
+        must await extract_all_async instead.
+        """
+        return asyncio.run(self.extract_all_async(use_case_context))
+
+    # Async extraction: the same fetches issued concurrently against the REST API
+
+    async def _request(self, client: httpx.AsyncClient, path: str, method: str = 'GET',
+                       **kwargs) -> httpx.Response:
+        """
+        Call the REST API through the shared semaphore, retrying with
+        exponential backoff while Salesforce refuses the call for exceeding
+        its request limits
+        """
+        for attempt in range(SALESFORCE_MAX_ATTEMPTS):
+            async with self._sf_semaphore:
+                response = await client.request(method, path, **kwargs)
+            self.record_api_usage(response.headers.get('Sforce-Limit-Info'))
+            if not is_rate_limited(response) or attempt == SALESFORCE_MAX_ATTEMPTS - 1:
+                return response
+            # Back off outside the semaphore so other calls keep flowing
+            await asyncio.sleep(min(60, 2 ** attempt + random.random()))
+        return response
+
+    def record_api_usage(self, limit_info: Optional[str]):
+        """Warn once when Sforce-Limit-Info shows the org's daily API quota running low"""
+        if not limit_info or self._api_usage_warned:
+            return
+        for part in limit_info.split(','):
+            name, _, usage = part.strip().partition('=')
+            if name != 'api-usage':
+                continue
+            used, _, limit = usage.partition('/')
+            if used.isdigit() and limit.isdigit() and int(used) >= int(limit) * SALESFORCE_API_USAGE_WARNING:
+                self._api_usage_warned = True
+                self.metadata['warnings'].append(
+                    f"Salesforce API usage is at {used}/{limit} requests for the last 24 hours"
+                )
+
+    async def _get_json(self, client: httpx.AsyncClient, path: str,
+                        params: Dict[str, str] = None) -> Dict[str, Any]:
+        response = await self._request(client, path, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def _get_json_cached(self, client: httpx.AsyncClient, path: str, phase: str,
+                               project: Callable[[Dict[str, Any]], Any]) -> Any:
+        """
+        GET a describe resource through the disk cache. Salesforce answers
+        If-Modified-Since with 304 when the metadata is unchanged, in which
+        case the cached projection is reused without transferring the body.
+        """
+        cached = _sf_cache.get_entry(self._cache_scope, phase)
+        headers = {'If-Modified-Since': cached[0]} if cached else None
+        fetched_at = formatdate(usegmt=True)
+
+        response = await self._request(client, path, headers=headers)
+        if response.status_code == 304 and cached:
+            return cached[1]
+        response.raise_for_status()
+
+        payload = project(response.json())
+        _sf_cache.put(self._cache_scope, phase, fetched_at, payload)
+        return payload
+
+    async def _query_all_cached(self, client: httpx.AsyncClient, phase: str, query: str,
+                                modstamp_query: str) -> List[Dict[str, Any]]:
+        """Run a query through the disk cache, keyed by its COUNT/MAX(modstamp) probe"""
+        probe = await self._query_all_async(client, modstamp_query)
+        modstamp = f"{probe[0].get('total')}:{probe[0].get('modstamp')}" if probe else ''
+
+        records = _sf_cache.get(self._cache_scope, phase, modstamp)
+        if records is None:
+            records = [slim_record(r) async for r in self._iter_query_async(client, query)]
+            _sf_cache.put(self._cache_scope, phase, modstamp, records)
+        return records
+
+    async def _iter_query_async(self, client: httpx.AsyncClient, query: str,
+                                tooling: bool = False) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield a SOQL query's records (REST or Tooling API) page by page,
+        following nextRecordsUrl, so callers never hold more than one raw page
+        """
+        path = f"{self._api_base}/tooling/query/" if tooling else f"{self._api_base}/query/"
+        result = await self._get_json(client, path, params={'q': query})
+        while True:
+            for record in result['records']:
+                yield record
+            if result.get('done', True):
+                return
+            result = await self._get_json(client, result['nextRecordsUrl'])
+
+    async def _query_all_async(self, client: httpx.AsyncClient, query: str,
+                               tooling: bool = False) -> List[Dict[str, Any]]:
+        """Run a SOQL query through REST (or the Tooling API), following nextRecordsUrl"""
+        return [record async for record in self._iter_query_async(client, query, tooling)]
+
+    async def _fetch_org_info_async(self, client: httpx.AsyncClient):
+        records = await self._query_all_async(client, ORG_INFO_QUERY)
+        if records:
+            self.metadata['org_info'] = records[0]
+
+    async def _fetch_object_fields_async(self, client: httpx.AsyncClient, object_name: str):
+        try:
+            fields = await self._get_json_cached(
+                client,
+                f"{self._api_base}/sobjects/{object_name}/describe/",
+                f"describe-{object_name}",
+                # The disk cache holds plain dicts; FieldInfo is rebuilt below
+                lambda describe: [project_field(field).to_dict() for field in describe['fields']]
+            )
+            fields = [FieldInfo(**field) for field in fields]
+        except Exception as e:
+            self.metadata['warnings'].append(f"Error fetching fields for {object_name}: {str(e)}")
+            fields = []
+        self.metadata['objects'][object_name]['fields'] = fields
+
+    async def _fetch_key_object_fields_async(self, client: httpx.AsyncClient):
+        await asyncio.gather(*(
+            self._fetch_object_fields_async(client, obj_name)
+            for obj_name in self.key_object_names()
+        ))
+        self.store_financial_fields()
+
+    async def _fetch_flows_async(self, client: httpx.AsyncClient):
+        # Only counts and the first few names per state are kept, so memory
+        # stays at one page however many flows the org has
+        flows = {'total': 0, 'active_count': 0, 'inactive_count': 0, 'active': [], 'inactive': []}
+        async for flow in self._iter_query_async(client, FLOW_QUERY):
+            state = 'active' if flow.get('IsActive') else 'inactive'
+            flows['total'] += 1
+            flows[f'{state}_count'] += 1
+            if len(flows[state]) < FLOW_NAMES_KEPT:
+                flows[state].append(flow['ApiName'])
+        self.metadata['flows'] = flows
+
+    async def _fetch_reports_async(self, client: httpx.AsyncClient):
+        self.metadata['reports'] = await self._query_all_cached(
+            client, 'reports', REPORT_QUERY, REPORT_MODSTAMP_QUERY
+        )
+
+    async def _fetch_validation_rules_async(self, client: httpx.AsyncClient):
+        try:
+            self.metadata['validation_rules'] = await self._query_all_async(
+                client, VALIDATION_RULE_QUERY, tooling=True
+            )
+        except Exception as e:
+            self.record_validation_rule_failure(e)
+
+    async def _fetch_apex_classes_async(self, client: httpx.AsyncClient):
+        try:
+            self.metadata['apex_classes'] = await self._query_all_async(
+                client, APEX_CLASS_QUERY, tooling=True
+            )
+        except Exception as e:
+            self.metadata['warnings'].append(f"Error fetching Apex classes: {str(e)}")
+
+    async def _fetch_users_async(self, client: httpx.AsyncClient):
+        # Never cached on disk: the records carry usernames and emails, and
+        # the query is capped at 50 rows anyway
+        self.metadata['users'] = [
+            slim_record(r) async for r in self._iter_query_async(client, USER_QUERY)
+        ]
+
+    async def _batch_query_async(self, client: httpx.AsyncClient,
+                                 queries: List[str]) -> List[Any]:
+        """
+        Run small queries in one Composite Batch round trip. Each subrequest
+        succeeds or fails on its own: the result list holds the records, or
+        the exception, per query.
+        """
+        response = await self._request(
+            client, f"{self._api_base}/composite/batch", method='POST',
+            json={'batchRequests': [
+                {'method': 'GET', 'url': f"v{self.sf.sf_version}/query?q={quote(query)}"}
+                for query in queries
+            ]}
+        )
+        response.raise_for_status()
+
+        results = []
+        for result in response.json()['results']:
+            if result.get('statusCode') == 200:
+                results.append(result['result']['records'])
+            else:
+                results.append(RuntimeError(str(result.get('result'))))
+        return results
+
+    async def _fetch_sample_data_async(self, client: httpx.AsyncClient):
+        queries = sample_queries(self.custom_object_names())
+        soql = [query for _, query, _ in queries]
+        try:
+            results = await self._batch_query_async(client, soql)
+        except Exception:
+            # Fall back to one request per query so a failed batch call
+            # doesn't lose the Account and Opportunity samples
+            results = await asyncio.gather(
+                *(self._query_all_async(client, query) for query in soql),
+                return_exceptions=True
+            )
+
+        sample_data = {'accounts': [], 'opportunities': []}
+        for (key, _, project), records in zip(queries, results):
+            # Skip if object has no Name field or other errors
+            if not isinstance(records, Exception):
+                sample_data[key] = [project(r) for r in records]
+
+        self.metadata['sample_data'] = sample_data
+
+    async def _fetch_objects_then_dependents_async(self, client: httpx.AsyncClient):
+        self.store_objects(await self._get_json_cached(
+            client,
+            f"{self._api_base}/sobjects/",
+            'sobjects',
+            lambda describe: {'sobjects': [
+                {key: sobject[key] for key in SOBJECT_SUMMARY_KEYS}
+                for sobject in describe['sobjects']
+            ]}
+        ))
+        await asyncio.gather(
+            self._fetch_key_object_fields_async(client),
+            self._fetch_sample_data_async(client)
+        )
+
+    async def extract_all_async(self, use_case_context: str = None):
+        """
+        Async extraction workflow. Login and the Claude analysis stay on the
+        sync clients (in a worker thread); every Salesforce data call goes
+        over httpx, with the independent ones - including the per-object
+        describes - awaited together.
+        """
+        await asyncio.to_thread(self.connect)
+        self._api_base = f"/services/data/v{self.sf.sf_version}"
+        self._sf_semaphore = asyncio.Semaphore(SALESFORCE_MAX_CONNECTIONS)
+
+        async with httpx.AsyncClient(
+            base_url=f"https://{self.sf.sf_instance}",
+            headers={'Authorization': f"Bearer {self.sf.session_id}"},
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=SALESFORCE_MAX_CONNECTIONS)
+        ) as client:
+            # Cached results are per org and per user: record visibility
+            # (sharing, field-level security) differs between users of an org.
+            # Session ids are "<org id>!<token>".
+            userinfo = await self._get_json(client, "/services/oauth2/userinfo")
+            org_id = self.sf.session_id.split('!', 1)[0]
+            self._cache_scope = f"{org_id}-{userinfo['user_id']}"
+
+            # Only the field describes and sample data need the object list;
+            # everything else starts alongside the global describe
+            await asyncio.gather(
+                self._fetch_objects_then_dependents_async(client),
+                self._fetch_org_info_async(client),
+                self._fetch_flows_async(client),
+                self._fetch_reports_async(client),
+                self._fetch_validation_rules_async(client),
+                self._fetch_apex_classes_async(client),
+                self._fetch_users_async(client)
+            )
 
         # Use Claude for analysis
-        self.analyze_with_claude(use_case_context)
+        await asyncio.to_thread(self.analyze_with_claude, use_case_context)
 
         return self.metadata
 
     def close(self):
         """Close connection"""
-        # Salesforce connection doesn't need explicit closing
-        pass
+        # The login's requests session holds pooled connections; the httpx
+        # client is closed by extract_all_async and the Claude client is shared
+        if self.sf is not None:
+            self.sf.session.close()
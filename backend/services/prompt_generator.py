@@ -3,12 +3,57 @@ Intelligent Test Prompt Generator with Claude AI
 Modular service for web application
 """
 
-import json
-import re
 from datetime import datetime, timezone
-from typing import List, Dict, Any
+from typing import List, Optional
+import orjson
 from anthropic import Anthropic
 
+from . import _claude_cache
+from ._anthropic_client import get_anthropic_client
+from ._org_context import build_org_context_blocks
+
+# Prompt caching is still behind a beta flag on the pinned SDK version
+PROMPT_CACHING_HEADERS = {"anthropic-beta": "prompt-caching-2024-07-31"}
+
+# Static part of the generation prompt, sent right after the shared org
+# context so it can be served from Anthropic's prompt cache. The cache
+# breakpoint goes on the last static block (the output schema): everything
+# up to and including the marked block is cached.
+GENERATION_INSTRUCTIONS = """Generate comprehensive test prompts for an AI agent based on the org metadata above.
+
+**CRITICAL Requirements:**
+- Generate 2-3 prompt variations per use case (15-20 total)
+- **USE ACTUAL ACCOUNT NAMES from sample_accounts** - DO NOT make up fake account names
+- **USE ACTUAL OPPORTUNITY NAMES from sample_opportunities** - DO NOT use placeholder names
+- **USE ACTUAL CUSTOM OBJECT NAMES and sample data** from custom_object_samples
+- Use actual field names from financial_fields when referencing commissions/amounts
+- Include varying difficulty levels: easy, medium, hard
+- Add edge cases that test disambiguation (ambiguous account names, etc.)
+- Include prompts that will challenge error handling"""
+
+GENERATION_USE_CASES = """**Use Cases to Cover:**
+1. Show insurance policies for an account (query custom objects)
+2. Calculate total commission for an account (aggregation)
+3. Find open opportunities closing this month (date filtering + user context)
+4. Create a lead (record creation with validation)
+5. Create an opportunity (record creation with account lookup)
+6. Build custom commission report (report generation with grouping)
+7. Sales goal progress tracking (data analysis)"""
+
+GENERATION_FORMAT = """Format as JSON array with this structure:
+[
+  {
+    "use_case": "UC1",
+    "prompt": "actual prompt text with real data",
+    "expected_object": "ObjectName",
+    "difficulty": "easy|medium|hard",
+    "challenges": ["list", "of", "challenges"],
+    "expected_behavior": "what agent should do"
+  }
+]
+
+Return ONLY the JSON array, no additional text."""
+
 
 def utc_now_iso() -> str:
     """Return current UTC timestamp as ISO string."""
@@ -16,136 +61,75 @@ def utc_now_iso() -> str:
 
 
 class ClaudePromptGenerator:
-    def __init__(self, metadata: dict, anthropic_api_key: str, model_id: str = "claude-3-5-sonnet-20241022"):
+    def __init__(self, metadata: dict, anthropic_api_key: str, model_id: str = "claude-3-5-sonnet-20241022",
+                 anthropic_client: Optional[Anthropic] = None):
         """Initialize with metadata and Claude client"""
         self.metadata = metadata
-        self.claude = Anthropic(api_key=anthropic_api_key)
+        self.claude = anthropic_client or get_anthropic_client(anthropic_api_key)
         self.model_id = model_id
 
     def generate_prompts(self, use_case_context: str = None):
         """Use Claude to generate context-aware prompts"""
-        # Prepare context for Claude
-        custom_objects = [
-            {'name': name, 'label': obj['label']}
-            for name, obj in self.metadata['objects'].items()
-            if obj.get('custom')
+        # Shared org context first, then the generation instructions (cache
+        # breakpoint on the last static block)
+        content = build_org_context_blocks(self.metadata) + [
+            {"type": "text", "text": GENERATION_INSTRUCTIONS},
+            {"type": "text", "text": GENERATION_USE_CASES},
+            {"type": "text", "text": GENERATION_FORMAT, "cache_control": {"type": "ephemeral"}}
         ]
-
-        # Find financial fields
-        financial_fields = {}
-        for obj_name, obj_data in self.metadata['objects'].items():
-            fields = [
-                f['name'] for f in obj_data.get('fields', [])
-                if any(kw in f['name'].lower() or kw in f['label'].lower()
-                      for kw in ['commission', 'premium', 'amount', 'policy'])
-            ]
-            if fields:
-                financial_fields[obj_name] = fields[:3]
-
-        # Get actual sample data from org
-        sample_data = self.metadata.get('sample_data', {})
-        sample_accounts = [acc['Name'] for acc in sample_data.get('accounts', [])]
-        sample_opportunities = [opp['Name'] for opp in sample_data.get('opportunities', [])]
-
-        # Get custom object sample data
-        custom_object_samples = {}
-        for obj_name in [name for name, obj in self.metadata['objects'].items() if obj.get('custom')][:5]:
-            if obj_name in sample_data:
-                custom_object_samples[obj_name] = [rec.get('Name') for rec in sample_data[obj_name] if rec.get('Name')]
-
-        context = {
-            'custom_objects': custom_objects[:10],
-            'financial_fields': financial_fields,
-            'sample_accounts': sample_accounts[:10] if sample_accounts else ["[No accounts found in org]"],
-            'sample_opportunities': sample_opportunities[:10] if sample_opportunities else ["[No opportunities found]"],
-            'custom_object_samples': custom_object_samples,
-            'total_flows': len(self.metadata['flows']),
-            'inactive_flows': [
-                f['ApiName'] for f in self.metadata['flows']
-                if not f.get('IsActive')
-            ][:5],
-            'reports': [
-                {'name': r['Name'], 'folder': r.get('FolderName')}
-                for r in self.metadata['reports'][:10]
-            ]
-        }
-
-        use_case_section = ""
         if use_case_context:
-            use_case_section = f"""
-**Organization-Specific Use Cases:**
+            content.append({"type": "text", "text": f"""**Organization-Specific Use Cases:**
 {use_case_context}
 
-Please generate prompts that specifically test these use cases.
-"""
-
-        # Create comprehensive prompt for Claude
-        prompt = f"""You are a Salesforce testing expert. Generate comprehensive test prompts for an AI agent based on this org metadata.
-
-**Org Metadata Context:**
-{json.dumps(context, indent=2)}
+Please generate prompts that specifically test these use cases."""})
 
-{use_case_section}
-
-**Use Cases to Cover:**
-1. Show insurance policies for an account (query custom objects)
-2. Calculate total commission for an account (aggregation)
-3. Find open opportunities closing this month (date filtering + user context)
-4. Create a lead (record creation with validation)
-5. Create an opportunity (record creation with account lookup)
-6. Build custom commission report (report generation with grouping)
-7. Sales goal progress tracking (data analysis)
-
-**CRITICAL Requirements:**
-- Generate 2-3 prompt variations per use case (15-20 total)
-- **USE ACTUAL ACCOUNT NAMES from sample_accounts** - DO NOT make up fake account names
-- **USE ACTUAL OPPORTUNITY NAMES from sample_opportunities** - DO NOT use placeholder names
-- **USE ACTUAL CUSTOM OBJECT NAMES and sample data** from custom_object_samples
-- Use actual field names from financial_fields when referencing commissions/amounts
-- Include varying difficulty levels: easy, medium, hard
-- Add edge cases that test disambiguation (ambiguous account names, etc.)
-- Include prompts that will challenge error handling
-- Format as JSON array with this structure:
-  [
-    {{
-      "use_case": "UC1",
-      "prompt": "actual prompt text with real data",
-      "expected_object": "ObjectName",
-      "difficulty": "easy|medium|hard",
-      "challenges": ["list", "of", "challenges"],
-      "expected_behavior": "what agent should do"
-    }}
-  ]
+        request = {
+            'model': self.model_id,
+            'max_tokens': 4096,
+            'temperature': 0.5,
+            'messages': [
+                {"role": "user", "content": content}
+            ]
+        }
 
-Return ONLY the JSON array, no additional text."""
+        # An identical request within the cache TTL reuses the stored result
+        cache_key = _claude_cache.request_key(request, self.claude.api_key)
+        cached = _claude_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
         try:
-            message = self.claude.messages.create(
-                model=self.model_id,
-                max_tokens=4096,
-                temperature=0.5,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+            # Stream the reply so text is consumed as it is generated
+            with self.claude.messages.stream(
+                **request,
+                extra_headers=PROMPT_CACHING_HEADERS
+            ) as stream:
+                text_parts = [text for text in stream.text_stream]
+                message = stream.get_final_message()
 
             # Extract and parse response
-            response_text = message.content[0].text
-
-            # Try to extract JSON from response
-            json_match = re.search(r'\[[\s\S]*\]', response_text)
-            if json_match:
-                prompts_json = json.loads(json_match.group())
-                return {
+            response_text = "".join(text_parts)
+
+            # Try to extract JSON from response: slice from the first '[' to
+            # the last ']' (linear, no regex backtracking) and decode natively
+            start = response_text.find('[')
+            end = response_text.rfind(']') + 1
+            if start != -1 and end > start:
+                prompts_json = orjson.loads(response_text[start:end])
+                result = {
                     'generation_timestamp': utc_now_iso(),
                     'total_prompts': len(prompts_json),
                     'model': message.model,
                     'tokens_used': {
                         'input': message.usage.input_tokens,
-                        'output': message.usage.output_tokens
+                        'output': message.usage.output_tokens,
+                        'cache_creation': getattr(message.usage, 'cache_creation_input_tokens', None),
+                        'cache_read': getattr(message.usage, 'cache_read_input_tokens', None)
                     },
                     'prompts': prompts_json
                 }
+                _claude_cache.put(cache_key, result)
+                return result
             else:
                 return {
                     'error': 'JSON parse failed',
@@ -3,76 +3,23 @@ Salesforce Org Test Preparation with Claude AI
 Modular service for web application
 """
 
-import json
-import re
 from datetime import datetime, timezone
-from typing import Any, Dict, Iterable, List, Union
+from typing import Optional
+import orjson
 from anthropic import Anthropic
 
+from . import _claude_cache
+from ._anthropic_client import get_anthropic_client
+from ._org_context import build_org_context_blocks
 
-def utc_now_iso() -> str:
-    """Return current UTC timestamp as ISO string."""
-    return datetime.now(timezone.utc).isoformat()
-
-
-def extract_text_from_blocks(content: Iterable[Union[Dict[str, Any], Any]]) -> str:
-    """Normalize Anthropic content blocks into a single text string."""
-    text_parts: List[str] = []
-
-    for block in content:
-        if isinstance(block, dict):
-            if block.get("type") == "text":
-                text_parts.append(block.get("text", ""))
-            continue
-
-        block_type = getattr(block, "type", None)
-        if block_type == "text":
-            text_parts.append(getattr(block, "text", ""))
-
-    return "\n".join(part.strip() for part in text_parts if part)
-
-
-class ClaudeTestPreparer:
-    def __init__(self, metadata: dict, anthropic_api_key: str, model_id: str = "claude-3-5-sonnet-20241022"):
-        """Initialize with metadata and Claude client"""
-        self.metadata = metadata
-        self.claude = Anthropic(api_key=anthropic_api_key)
-        self.model_id = model_id
-
-    def generate_preparation_plan(self, use_case_context: str = None):
-        """Use Claude to generate comprehensive test preparation plan"""
-        # Prepare org context
-        org_context = {
-            'org_type': self.metadata['org_info'].get('OrganizationType'),
-            'is_sandbox': self.metadata['org_info'].get('IsSandbox'),
-            'custom_objects': [
-                name for name, obj in self.metadata['objects'].items()
-                if obj.get('custom')
-            ][:10],
-            'flows': {
-                'total': len(self.metadata['flows']),
-                'active': [f['ApiName'] for f in self.metadata['flows'] if f.get('IsActive')][:5],
-                'inactive': [f['ApiName'] for f in self.metadata['flows'] if not f.get('IsActive')][:5]
-            },
-            'reports': len(self.metadata['reports']),
-            'validation_rules': len(self.metadata['validation_rules'])
-        }
-
-        use_case_section = ""
-        if use_case_context:
-            use_case_section = f"""
-**Organization-Specific Use Cases:**
-{use_case_context}
-
-Please incorporate these use cases into the test preparation plan.
-"""
+# Prompt caching is still behind a beta flag on the pinned SDK version
+PROMPT_CACHING_HEADERS = {"anthropic-beta": "prompt-caching-2024-07-31"}
 
-        prompt = f"""You are a Salesforce testing expert. Create a comprehensive test preparation plan to challenge an AI agent's capabilities.
-
-**Current Org State:**
-{json.dumps(org_context, indent=2)}
-
-{use_case_section}
+# Static part of the preparation prompt, sent right after the shared org
+# context so it can be served from Anthropic's prompt cache. The cache
+# breakpoint goes on the last static block (the output schema): everything
+# up to and including the marked block is cached.
+PREPARATION_INSTRUCTIONS = """Create a comprehensive test preparation plan to challenge an AI agent's capabilities, based on the org state above.
 
 **Your Task:**
 Generate a detailed test preparation plan with specific, actionable steps to create challenging test scenarios. Include:
@@ -89,48 +36,95 @@ For each challenge category, provide:
 - Specific manual steps to execute in Salesforce
 - Expected test prompts to use
 - What agent behavior to verify
-- Why this tests a specific capability
+- Why this tests a specific capability"""
 
-Format as JSON:
-{{
+PREPARATION_FORMAT = """Format as JSON:
+{
   "tasks": [
-    {{
+    {
       "category": "CATEGORY_NAME",
       "action": "brief description",
       "purpose": "why this is important",
       "manual_steps": ["step 1", "step 2"],
       "test_prompts": ["prompt 1", "prompt 2"],
       "verification": ["what to check"]
-    }}
+    }
   ]
-}}
+}
 
 Return ONLY the JSON, no additional text."""
 
+
+def utc_now_iso() -> str:
+    """Return current UTC timestamp as ISO string."""
+    return datetime.now(timezone.utc).isoformat()
+
+
+class ClaudeTestPreparer:
+    def __init__(self, metadata: dict, anthropic_api_key: str, model_id: str = "claude-3-5-sonnet-20241022",
+                 anthropic_client: Optional[Anthropic] = None):
+        """Initialize with metadata and Claude client"""
+        self.metadata = metadata
+        self.claude = anthropic_client or get_anthropic_client(anthropic_api_key)
+        self.model_id = model_id
+
+    def generate_preparation_plan(self, use_case_context: str = None):
+        """Use Claude to generate comprehensive test preparation plan"""
+        # Shared org context first, then the preparation instructions (cache
+        # breakpoint on the last static block)
+        content = build_org_context_blocks(self.metadata) + [
+            {"type": "text", "text": PREPARATION_INSTRUCTIONS},
+            {"type": "text", "text": PREPARATION_FORMAT, "cache_control": {"type": "ephemeral"}}
+        ]
+        if use_case_context:
+            content.append({"type": "text", "text": f"""**Organization-Specific Use Cases:**
+{use_case_context}
+
+Please incorporate these use cases into the test preparation plan."""})
+
+        request = {
+            'model': self.model_id,
+            'max_tokens': 4096,
+            'temperature': 0.4,
+            'messages': [
+                {"role": "user", "content": content}
+            ]
+        }
+
+        # An identical request within the cache TTL reuses the stored result
+        cache_key = _claude_cache.request_key(request, self.claude.api_key)
+        cached = _claude_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
         try:
-            message = self.claude.messages.create(
-                model=self.model_id,
-                max_tokens=4096,
-                temperature=0.4,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-
-            response_text = extract_text_from_blocks(message.content)
-
-            # Extract JSON
-            json_match = re.search(r'\{[\s\S]*\}', response_text)
-            if json_match:
-                plan = json.loads(json_match.group())
+            # Stream the reply so text is consumed as it is generated
+            with self.claude.messages.stream(
+                **request,
+                extra_headers=PROMPT_CACHING_HEADERS
+            ) as stream:
+                text_parts = [text for text in stream.text_stream]
+                message = stream.get_final_message()
+
+            response_text = "".join(text_parts).strip()
+
+            # Extract JSON: slice from the first '{' to the last '}' (linear,
+            # no regex backtracking) and decode natively
+            start = response_text.find('{')
+            end = response_text.rfind('}') + 1
+            if start != -1 and end > start:
+                plan = orjson.loads(response_text[start:end])
                 plan['generation_timestamp'] = utc_now_iso()
                 plan['model'] = message.model
                 usage = getattr(message, 'usage', None)
                 plan['tokens_used'] = {
                     'input': getattr(usage, 'input_tokens', None),
-                    'output': getattr(usage, 'output_tokens', None)
+                    'output': getattr(usage, 'output_tokens', None),
+                    'cache_creation': getattr(usage, 'cache_creation_input_tokens', None),
+                    'cache_read': getattr(usage, 'cache_read_input_tokens', None)
                 }
 
+                _claude_cache.put(cache_key, plan)
                 return plan
             else:
                 return {
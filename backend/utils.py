@@ -2,134 +2,522 @@
 Utility functions for data conversion and session management
 """
 
-import csv
-import json
-import uuid
-from io import StringIO
+import hashlib
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
 from datetime import datetime, timezone
-from typing import Dict, List, Any
+from operator import itemgetter
+from types import MappingProxyType
+from typing import Dict, List, Any, Iterable, Iterator, Mapping, Optional, Tuple
+
+import orjson
+
+_UTC = timezone.utc
 
 
 def utc_now_iso() -> str:
     """Return current UTC timestamp as ISO string."""
-    return datetime.now(timezone.utc).isoformat()
+    return datetime.now(_UTC).isoformat()
 
 
 def generate_session_id() -> str:
-    """Generate unique session ID"""
-    return str(uuid.uuid4())
+    """Generate unique session ID (128 random bits as 32 hex characters)"""
+    # Same bytes secrets.token_hex(16) returns, without importing secrets
+    # (and its random/hmac/base64 dependencies) at startup
+    return os.urandom(16).hex()
+
+
+def _csv_escape(value: Any) -> str:
+    """Render one CSV field, quoting it only when needed (as csv.QUOTE_MINIMAL does)"""
+    if value is None:
+        return ''
+    text = value if isinstance(value, str) else str(value)
+    # Four substring scans run in C without allocating; this measured well
+    # ahead of str.translate, a regex search or a set intersection
+    if '"' in text or ',' in text or '\n' in text or '\r' in text:
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def _csv_row(fields: Iterable[Any]) -> str:
+    """Render one CSV record with csv.writer's default CRLF terminator"""
+    return ','.join(map(_csv_escape, fields)) + '\r\n'
+
+
+# CSV header lines never change, so they are rendered (and encoded) once at import
+PROMPT_CSV_FIELDS = (
+    'use_case',
+    'prompt',
+    'expected_object',
+    'difficulty',
+    'challenges',
+    'expected_behavior'
+)
+PROMPT_CSV_HEADER = _csv_row(PROMPT_CSV_FIELDS).encode('utf-8')
+
+TEST_PLAN_CSV_FIELDS = (
+    'category',
+    'action',
+    'purpose',
+    'manual_steps',
+    'test_prompts',
+    'verification'
+)
+TEST_PLAN_CSV_HEADER = _csv_row(TEST_PLAN_CSV_FIELDS).encode('utf-8')
+
+METADATA_CSV_HEADER = _csv_row(('Metric', 'Value')).encode('utf-8')
+
+
+# Prompt rows rendered into each chunk of a streamed CSV download
+PROMPT_CSV_CHUNK_ROWS = 100
+
+
+# One C-level lookup pulls every CSV column out of a prompt; only prompts
+# missing a column pay for merging in the defaults
+_PROMPT_CSV_DEFAULTS = dict.fromkeys(PROMPT_CSV_FIELDS, '')
+_prompt_csv_values = itemgetter(*PROMPT_CSV_FIELDS)
+_CHALLENGES_INDEX = PROMPT_CSV_FIELDS.index('challenges')
+
+
+def _prompt_csv_row(prompt: Dict[str, Any]) -> str:
+    """Render one test prompt as a CSV record"""
+    try:
+        values = list(_prompt_csv_values(prompt))
+    except KeyError:
+        values = list(_prompt_csv_values({**_PROMPT_CSV_DEFAULTS, **prompt}))
+    # Convert challenges list to a semicolon-separated string
+    values[_CHALLENGES_INDEX] = '; '.join(values[_CHALLENGES_INDEX] or ())
+    return _csv_row(values)
+
+
+def iter_prompts_csv(prompts: List[Dict[str, Any]]) -> Iterator[bytes]:
+    """Yield test prompts as UTF-8 CSV, header first and then PROMPT_CSV_CHUNK_ROWS rows per chunk"""
+    if not prompts:
+        return
 
+    yield PROMPT_CSV_HEADER
 
-def convert_prompts_to_csv(prompts: List[Dict[str, Any]]) -> str:
-    """Convert list of test prompts to CSV format"""
+    for start in range(0, len(prompts), PROMPT_CSV_CHUNK_ROWS):
+        yield "".join(map(_prompt_csv_row, prompts[start:start + PROMPT_CSV_CHUNK_ROWS])).encode('utf-8')
+
+
+def convert_prompts_to_csv(prompts: List[Dict[str, Any]]) -> bytes:
+    """Convert list of test prompts to UTF-8 CSV"""
     if not prompts:
-        return ""
-
-    output = StringIO()
-
-    # Define CSV headers
-    fieldnames = [
-        'use_case',
-        'prompt',
-        'expected_object',
-        'difficulty',
-        'challenges',
-        'expected_behavior'
-    ]
+        return b""
+    return PROMPT_CSV_HEADER + "".join(map(_prompt_csv_row, prompts)).encode('utf-8')
 
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    writer.writeheader()
 
-    for prompt in prompts:
-        # Convert challenges list to comma-separated string
-        row = {
-            'use_case': prompt.get('use_case', ''),
-            'prompt': prompt.get('prompt', ''),
-            'expected_object': prompt.get('expected_object', ''),
-            'difficulty': prompt.get('difficulty', ''),
-            'challenges': '; '.join(prompt.get('challenges', [])),
-            'expected_behavior': prompt.get('expected_behavior', '')
-        }
-        writer.writerow(row)
+# The first three test-plan columns are text, the last three are step lists
+_TEST_PLAN_CSV_DEFAULTS = dict.fromkeys(TEST_PLAN_CSV_FIELDS, '')
+_test_plan_text_values = itemgetter(*TEST_PLAN_CSV_FIELDS[:3])
+_test_plan_list_values = itemgetter(*TEST_PLAN_CSV_FIELDS[3:])
 
-    return output.getvalue()
 
+def _test_plan_csv_row(task: Dict[str, Any]) -> str:
+    """Render one test-plan task as a CSV record"""
+    try:
+        text_values = _test_plan_text_values(task)
+        list_values = _test_plan_list_values(task)
+    except KeyError:
+        task = {**_TEST_PLAN_CSV_DEFAULTS, **task}
+        text_values = _test_plan_text_values(task)
+        list_values = _test_plan_list_values(task)
+    # Step lists become ' | '-separated cells
+    return _csv_row(text_values + tuple(' | '.join(steps or ()) for steps in list_values))
 
-def convert_test_plan_to_csv(plan: Dict[str, Any]) -> str:
-    """Convert test preparation plan to CSV format"""
-    if not plan or 'tasks' not in plan:
-        return ""
 
-    output = StringIO()
+def convert_test_plan_to_csv(plan: Dict[str, Any]) -> bytes:
+    """Convert test preparation plan to UTF-8 CSV"""
+    if not plan or 'tasks' not in plan:
+        return b""
+
+    return TEST_PLAN_CSV_HEADER + "".join(map(_test_plan_csv_row, plan['tasks'])).encode('utf-8')
+
+
+# Shared read-only stand-in for a missing metadata section
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+
+# Sample record names kept in the precomputed summary
+SAMPLE_NAME_LIMIT = 50
+
+
+def precompute_metadata_summary(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Walk the extracted metadata once for the fields the summary and download endpoints reuse"""
+    org_info = metadata.get('org_info') or _EMPTY
+    sample_data = metadata.get('sample_data') or _EMPTY
+    custom_object_names = metadata.get('_custom_object_names')
+    if custom_object_names is None:
+        objects = metadata.get('objects') or _EMPTY
+        custom_object_names = [name for name, obj in objects.items() if obj.get('custom')]
+    return {
+        'org_name': org_info.get('Name', ''),
+        'org_type': org_info.get('OrganizationType', ''),
+        'is_sandbox': org_info.get('IsSandbox', False),
+        'custom_object_names': list(custom_object_names),
+        'total_flows': (metadata.get('flows') or _EMPTY).get('total', 0),
+        'total_reports': len(metadata.get('reports') or ()),
+        # Pre-sliced record names for the step-2 prompt context
+        'sample_account_names': [acc['Name'] for acc in (sample_data.get('accounts') or ())[:SAMPLE_NAME_LIMIT]],
+        'sample_opportunity_names': [opp['Name'] for opp in (sample_data.get('opportunities') or ())[:SAMPLE_NAME_LIMIT]]
+    }
+
+
+def convert_metadata_to_csv(metadata: Dict[str, Any],
+                            custom_object_names: Optional[List[str]] = None) -> bytes:
+    """Convert metadata summary to UTF-8 CSV"""
+    org_info = metadata.get('org_info') or _EMPTY
+    objects = metadata.get('objects') or _EMPTY
+    flows = metadata.get('flows') or _EMPTY
+
+    # Prefer the counts the extractor already memoized over rescanning
+    if custom_object_names is None:
+        custom_object_names = metadata.get('_custom_object_names')
+    if custom_object_names is not None:
+        custom_count = len(custom_object_names)
+    else:
+        custom_count = sum(1 for obj in objects.values() if obj.get('custom'))
 
-    fieldnames = [
-        'category',
-        'action',
-        'purpose',
-        'manual_steps',
-        'test_prompts',
-        'verification'
+    # Create a summary CSV
+    rows = [
+        # Org info
+        ('Org Name', org_info.get('Name', '')),
+        ('Org Type', org_info.get('OrganizationType', '')),
+        ('Is Sandbox', org_info.get('IsSandbox', '')),
+
+        # Counts
+        ('Total Objects', len(objects)),
+        ('Custom Objects', custom_count),
+        ('Total Flows', flows.get('total', 0)),
+        ('Active Flows', flows.get('active_count', 0)),
+        ('Total Reports', len(metadata.get('reports') or ())),
+        ('Validation Rules', len(metadata.get('validation_rules') or ())),
+        ('Apex Classes', len(metadata.get('apex_classes') or ())),
+        ('Active Users', len(metadata.get('users') or ())),
     ]
 
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    writer.writeheader()
+    return METADATA_CSV_HEADER + "".join(map(_csv_row, rows)).encode('utf-8')
+
+
+def json_default(value: Any) -> Any:
+    """orjson fallback: slotted records (e.g. FieldInfo) become dicts, anything else a string"""
+    to_dict = getattr(value, 'to_dict', None)
+    if to_dict is not None:
+        return to_dict()
+    return str(value)
+
+
+def iter_json_object(obj: Dict[str, Any], stream_keys: Iterable[str] = (),
+                     option: int = 0) -> Iterator[bytes]:
+    """
+    Encode a dict as a JSON object piece by piece for streaming responses.
+    List values under stream_keys are emitted one element at a time, so the
+    full document is never materialized. With orjson.OPT_INDENT_2 the output
+    matches orjson.dumps(obj, option=option) byte for byte.
+    """
+    stream_keys = frozenset(stream_keys)
+    if not obj:
+        yield b'{}'
+        return
+
+    # Pretty-printing: each nested value is re-indented to its depth
+    indent = bool(option & orjson.OPT_INDENT_2)
+    key_sep = b': ' if indent else b':'
+    open_pad, close_pad = (b'\n  ', b'\n') if indent else (b'', b'')
+    item_pad = b'\n    ' if indent else b''
+
+    def encode(value: Any, pad: bytes) -> bytes:
+        raw = orjson.dumps(value, option=option, default=json_default)
+        return raw.replace(b'\n', pad) if indent else raw
+
+    yield b'{'
+    for i, (key, value) in enumerate(obj.items()):
+        yield (b',' if i else b'') + open_pad + orjson.dumps(key) + key_sep
+        if key in stream_keys and value:
+            yield b'['
+            for j, item in enumerate(value):
+                yield (b',' if j else b'') + item_pad + encode(item, item_pad)
+            yield open_pad + b']'
+        else:
+            yield encode(value, open_pad)
+    yield close_pad + b'}'
+
+
+# Session storage: Redis when REDIS_URL is set (shared across workers),
+# otherwise in-process memory
+SESSION_TTL_SECONDS = 3600
+
+# Pooled connections per worker process (override with REDIS_MAX_CONNECTIONS)
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "20"))
+
+_REDIS_URL = os.getenv("REDIS_URL")
+_redis_client = None
+
+# redis is only imported when it will be used, so memory-backed workers
+# never pay for loading the client library
+if _REDIS_URL:
+    try:
+        import redis
+    except ImportError:  # redis is optional; sessions stay in memory
+        pass
+    else:
+        _redis_client = redis.Redis(connection_pool=redis.ConnectionPool.from_url(
+            _REDIS_URL, max_connections=REDIS_MAX_CONNECTIONS
+        ))
+
+# Field update that only applies while the session hash exists, checked and
+# written in one atomic step. ARGV is the TTL followed by field/value pairs.
+_UPDATE_SESSION_LUA = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return 0
+end
+if #ARGV > 1 then
+    redis.call('HSET', KEYS[1], unpack(ARGV, 2))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return 1
+"""
+_update_session_script = (
+    _redis_client.register_script(_UPDATE_SESSION_LUA) if _redis_client is not None else None
+)
 
-    for task in plan.get('tasks', []):
-        row = {
-            'category': task.get('category', ''),
-            'action': task.get('action', ''),
-            'purpose': task.get('purpose', ''),
-            'manual_steps': ' | '.join(task.get('manual_steps', [])),
-            'test_prompts': ' | '.join(task.get('test_prompts', [])),
-            'verification': ' | '.join(task.get('verification', []))
-        }
-        writer.writerow(row)
+# In-memory fallback: least recently used sessions are evicted past this
+# many entries in total, and every entry expires SESSION_TTL_SECONDS after
+# its last write
+MAX_MEMORY_SESSIONS = 512
 
-    return output.getvalue()
+# Sessions are striped across independently locked shards so concurrent
+# requests for different sessions rarely wait on each other
+SESSION_SHARDS = 16
 
+SESSION_STORAGE: Tuple["OrderedDict[str, Tuple[float, Dict[str, Any]]]", ...] = tuple(
+    OrderedDict() for _ in range(SESSION_SHARDS)
+)
+_SESSION_LOCKS = tuple(threading.Lock() for _ in range(SESSION_SHARDS))
 
-def convert_metadata_to_csv(metadata: Dict[str, Any]) -> str:
-    """Convert metadata summary to CSV format"""
-    output = StringIO()
+# Sessions held across all shards, so MAX_MEMORY_SESSIONS bounds the whole
+# store however unevenly the sessions hash
+_session_count = 0
+_SESSION_COUNT_LOCK = threading.Lock()
+
+
+def _session_shard_index(session_id: str) -> int:
+    return hash(session_id) % SESSION_SHARDS
+
+
+def _session_shard(session_id: str) -> Tuple["OrderedDict[str, Tuple[float, Dict[str, Any]]]", threading.Lock]:
+    """In-memory shard and its lock for one session"""
+    index = _session_shard_index(session_id)
+    return SESSION_STORAGE[index], _SESSION_LOCKS[index]
+
+
+def _count_sessions(delta: int) -> int:
+    """Adjust the global session count; returns how far it is over MAX_MEMORY_SESSIONS"""
+    global _session_count
+    with _SESSION_COUNT_LOCK:
+        _session_count += delta
+        return _session_count - MAX_MEMORY_SESSIONS
+
+
+def _evict_sessions(excess: int, first_shard: int, keep_id: str):
+    """
+    Evict `excess` sessions, least recently used first within each shard,
+    starting with the shard just written to. Only one shard lock is held at
+    a time, and keep_id (the session just stored) is never evicted.
+    """
+    for offset in range(SESSION_SHARDS):
+        index = (first_shard + offset) % SESSION_SHARDS
+        shard = SESSION_STORAGE[index]
+        with _SESSION_LOCKS[index]:
+            victims = [session_id for session_id in shard if session_id != keep_id][:excess]
+            for session_id in victims:
+                del shard[session_id]
+        if victims:
+            excess = _count_sessions(-len(victims))
+        if excess <= 0:
+            return
+
+
+# Redis session fields at least this large (e.g. the org metadata) are
+# stored zlib-compressed; the prefix can never start a JSON document
+SESSION_COMPRESS_MIN_BYTES = 1024
+SESSION_COMPRESS_LEVEL = 1
+_COMPRESSED_PREFIX = b'z:'
+
+
+def _session_key(session_id: str) -> str:
+    """Redis hash key holding one session"""
+    return f"session:{session_id}"
 
-    # Create a summary CSV
-    writer = csv.writer(output)
-    writer.writerow(['Metric', 'Value'])
 
-    # Org info
-    writer.writerow(['Org Name', metadata.get('org_info', {}).get('Name', '')])
-    writer.writerow(['Org Type', metadata.get('org_info', {}).get('OrganizationType', '')])
-    writer.writerow(['Is Sandbox', metadata.get('org_info', {}).get('IsSandbox', '')])
+def _encode_value(value: Any) -> bytes:
+    """Encode one session field, zlib-compressing it when it is large"""
+    raw = orjson.dumps(value, default=json_default)
+    if len(raw) < SESSION_COMPRESS_MIN_BYTES:
+        return raw
+    return _COMPRESSED_PREFIX + zlib.compress(raw, SESSION_COMPRESS_LEVEL)
 
-    # Counts
-    writer.writerow(['Total Objects', len(metadata.get('objects', {}))])
-    custom_objects = [name for name, obj in metadata.get('objects', {}).items() if obj.get('custom')]
-    writer.writerow(['Custom Objects', len(custom_objects)])
-    writer.writerow(['Total Flows', len(metadata.get('flows', []))])
-    writer.writerow(['Active Flows', sum(1 for f in metadata.get('flows', []) if f.get('IsActive'))])
-    writer.writerow(['Total Reports', len(metadata.get('reports', []))])
-    writer.writerow(['Validation Rules', len(metadata.get('validation_rules', []))])
-    writer.writerow(['Apex Classes', len(metadata.get('apex_classes', []))])
-    writer.writerow(['Active Users', len(metadata.get('users', []))])
 
-    return output.getvalue()
+def _decode_value(raw: bytes) -> Any:
+    """Decode one session field written by _encode_value"""
+    if raw.startswith(_COMPRESSED_PREFIX):
+        raw = zlib.decompress(raw[len(_COMPRESSED_PREFIX):])
+    return orjson.loads(raw)
 
 
-# In-memory session storage (use Redis/database in production)
-SESSION_STORAGE: Dict[str, Dict[str, Any]] = {}
+def _encode_fields(data: Dict[str, Any]) -> Dict[str, bytes]:
+    """Encode each session field separately so fields can be updated independently"""
+    return {key: _encode_value(value) for key, value in data.items()}
 
 
 def store_session_data(session_id: str, data: Dict[str, Any]):
     """Store session data"""
-    SESSION_STORAGE[session_id] = data
+    if _redis_client is None:
+        index = _session_shard_index(session_id)
+        shard = SESSION_STORAGE[index]
+        with _SESSION_LOCKS[index]:
+            is_new = session_id not in shard
+            shard[session_id] = (time.monotonic() + SESSION_TTL_SECONDS, data)
+            shard.move_to_end(session_id)
+        if is_new:
+            excess = _count_sessions(1)
+            if excess > 0:
+                _evict_sessions(excess, index, session_id)
+        return
+
+    pipe = _redis_client.pipeline()
+    _queue_session_write(pipe, session_id, data)
+    pipe.execute()
+
+
+def store_session_data_bulk(sessions: Dict[str, Dict[str, Any]]):
+    """Store several sessions at once; with Redis this is a single round trip"""
+    if _redis_client is None:
+        for session_id, data in sessions.items():
+            store_session_data(session_id, data)
+        return
+
+    pipe = _redis_client.pipeline()
+    for session_id, data in sessions.items():
+        _queue_session_write(pipe, session_id, data)
+    pipe.execute()
+
+
+def _queue_session_write(pipe, session_id: str, data: Dict[str, Any]):
+    """Queue the commands that replace one session's hash on a Redis pipeline"""
+    key = _session_key(session_id)
+    pipe.delete(key)
+    # HSET rejects an empty mapping; an empty session is just the deleted key
+    if data:
+        pipe.hset(key, mapping=_encode_fields(data))
+        pipe.expire(key, SESSION_TTL_SECONDS)
+
+
+def update_session_data(session_id: str, fields: Dict[str, Any]) -> bool:
+    """
+    Add or replace individual session fields without rewriting the rest (e.g.
+    metadata). A session that no longer exists is left alone; returns whether
+    the update was applied.
+    """
+    if _redis_client is None:
+        shard, lock = _session_shard(session_id)
+        with lock:
+            entry = shard.get(session_id)
+            if entry is None:
+                return False
+            expires_at, data = entry
+            if expires_at <= time.monotonic():
+                # Expired sessions stay gone, as with Redis key expiry
+                del shard[session_id]
+                _count_sessions(-1)
+                return False
+            data.update(fields)
+            shard[session_id] = (time.monotonic() + SESSION_TTL_SECONDS, data)
+            shard.move_to_end(session_id)
+        return True
+
+    # A plain HSET on a missing key would recreate an expired or deleted
+    # session holding only these fields, so the existence check and the write
+    # run together server-side
+    args = [SESSION_TTL_SECONDS]
+    for field, value in _encode_fields(fields).items():
+        args += (field, value)
+    return bool(_update_session_script(keys=[_session_key(session_id)], args=args))
 
 
 def get_session_data(session_id: str) -> Dict[str, Any]:
     """Retrieve session data"""
-    return SESSION_STORAGE.get(session_id, {})
+    if _redis_client is None:
+        shard, lock = _session_shard(session_id)
+        with lock:
+            entry = shard.get(session_id)
+            if entry is None:
+                return {}
+            expires_at, data = entry
+            if expires_at <= time.monotonic():
+                del shard[session_id]
+                _count_sessions(-1)
+                return {}
+            shard.move_to_end(session_id)
+            return data
+
+    raw = _redis_client.hgetall(_session_key(session_id))
+    return {key.decode('utf-8'): _decode_value(value) for key, value in raw.items()}
 
 
 def delete_session_data(session_id: str):
     """Delete session data (cleanup)"""
-    if session_id in SESSION_STORAGE:
-        del SESSION_STORAGE[session_id]
+    if _redis_client is None:
+        shard, lock = _session_shard(session_id)
+        with lock:
+            if shard.pop(session_id, None) is not None:
+                _count_sessions(-1)
+        return
+
+    _redis_client.delete(_session_key(session_id))
+
+
+# Short-lived cache of extracted metadata so a retry against the same org
+# skips the Salesforce round trips entirely. Bounded like the session store:
+# expired entries are purged on every store and the least recently used
+# entry is evicted past EXTRACTION_CACHE_MAX_ENTRIES
+EXTRACTION_CACHE_TTL_SECONDS = 600
+EXTRACTION_CACHE_MAX_ENTRIES = 32
+EXTRACTION_CACHE: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_EXTRACTION_CACHE_LOCK = threading.Lock()
+
+
+def extraction_cache_key(username: str, password: str, security_token: str,
+                         domain: str, use_case_description: str) -> str:
+    """Hash the credentials and use case into a cache key (secrets are never stored)"""
+    raw = f"{username}|{password}|{security_token}|{domain}|{use_case_description}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def get_cached_extraction(cache_key: str) -> Optional[Dict[str, Any]]:
+    """Return cached metadata for cache_key, or None if missing or expired"""
+    with _EXTRACTION_CACHE_LOCK:
+        entry = EXTRACTION_CACHE.get(cache_key)
+        if entry is None:
+            return None
+        expires_at, metadata = entry
+        if expires_at <= time.monotonic():
+            del EXTRACTION_CACHE[cache_key]
+            return None
+        EXTRACTION_CACHE.move_to_end(cache_key)
+        return metadata
+
+
+def store_cached_extraction(cache_key: str, metadata: Dict[str, Any]):
+    """Cache extracted metadata for EXTRACTION_CACHE_TTL_SECONDS"""
+    now = time.monotonic()
+    with _EXTRACTION_CACHE_LOCK:
+        for key in [key for key, (expires_at, _) in EXTRACTION_CACHE.items() if expires_at <= now]:
+            del EXTRACTION_CACHE[key]
+        EXTRACTION_CACHE[cache_key] = (now + EXTRACTION_CACHE_TTL_SECONDS, metadata)
+        EXTRACTION_CACHE.move_to_end(cache_key)
+        while len(EXTRACTION_CACHE) > EXTRACTION_CACHE_MAX_ENTRIES:
+            EXTRACTION_CACHE.popitem(last=False)
@@ -0,0 +1,237 @@
+"""
+Shared helpers for the Claude-powered CLI scripts
+Builds the cached org-context prefix reused by every Claude call
+"""
+
+import json
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+# Prompt caching is still behind a beta flag on the pinned SDK version
+PROMPT_CACHING_HEADERS = {"anthropic-beta": "prompt-caching-2024-07-31"}
+
+_UTC = timezone.utc
+_TEXT = "text"
+
+# Keywords that mark a field as commission/financial data
+FINANCIAL_FIELD_RE = re.compile(r'commission|premium|amount|value|policy', re.IGNORECASE)
+
+SYSTEM_RUBRIC = """You are a Salesforce testing expert helping to evaluate an AI agent that operates on a Salesforce org.
+
+The next block is a JSON snapshot of the org under test. Always ground your answers in it:
+- Use the actual object, field, flow, and report names it contains
+- Use the actual record names from sample_accounts, sample_opportunities, and custom_object_samples
+- Never invent placeholder names when real data is available
+
+The user message describes the specific artifact to produce."""
+
+
+def utc_now_iso() -> str:
+    """Return current UTC timestamp as ISO string."""
+    return datetime.now(_UTC).isoformat()
+
+
+def extract_text_from_blocks(content: Iterable[Union[Dict[str, Any], Any]],
+                             separator: str = "\n\n") -> str:
+    """Normalize Anthropic content blocks into a single text string."""
+    def _iter_text() -> Iterable[str]:
+        for block in content:
+            if isinstance(block, dict):
+                if block.get("type") != _TEXT:
+                    continue
+                text = block.get(_TEXT, "").strip()
+            elif getattr(block, "type", None) == _TEXT:
+                text = getattr(block, _TEXT, "").strip()
+            else:
+                continue
+
+            if text:
+                yield text
+
+    return separator.join(_iter_text())
+
+
+def extract_json_block(text: str, open_char: str = '{', close_char: str = '}') -> Optional[str]:
+    """
+    Return the first balanced JSON object (or array) embedded in text.
+
+    Scans forward from the first open_char tracking nesting depth, skipping
+    over string literals and escapes, so the cost is linear in the length
+    of the response with no regex backtracking.
+    """
+    start = text.find(open_char)
+    if start < 0:
+        return None
+
+    depth = 0
+    in_str = False
+    esc = False
+    for i in range(start, len(text)):
+        c = text[i]
+        if in_str:
+            if esc:
+                esc = False
+            elif c == '\\':
+                esc = True
+            elif c == '"':
+                in_str = False
+        elif c == '"':
+            in_str = True
+        elif c == open_char:
+            depth += 1
+        elif c == close_char:
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return None
+
+
+def parse_json(text: str) -> Any:
+    """Parse a JSON string, using orjson's native parser when available."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def json_default(value: Any) -> Any:
+    """JSON fallback encoder: slotted records become dicts (unset attributes dropped), anything else a string."""
+    slots = getattr(type(value), '__slots__', None)
+    if slots is None:
+        return str(value)
+    return {
+        key: attr for key in slots
+        if (attr := getattr(value, key)) is not None
+    }
+
+
+def to_builtins(value: Any) -> Any:
+    """Recursively convert slotted records inside dicts/lists into plain dicts."""
+    if isinstance(value, dict):
+        return {key: to_builtins(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_builtins(item) for item in value]
+    if hasattr(type(value), '__slots__'):
+        return to_builtins(json_default(value))
+    return value
+
+
+def load_json(filename: str) -> Any:
+    """Read a JSON file, using orjson's native parser when available."""
+    raw = Path(filename).read_bytes()
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def save_json(data: Any, filename: str) -> None:
+    """Write data to filename as indented JSON, using orjson when available."""
+    if orjson is not None:
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(
+                data,
+                option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS,
+                default=json_default
+            ))
+    else:
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent=2, default=json_default)
+
+
+def financial_field_names(fields: Iterable[Dict[str, Any]], limit: int = 5) -> List[str]:
+    """Return the names of (at most `limit`) fields whose name or label looks financial."""
+    search = FINANCIAL_FIELD_RE.search
+    return [
+        f['name'] for f in fields
+        if search(f['name']) or search(f['label'])
+    ][:limit]
+
+
+def build_org_context(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Project extracted metadata into the canonical org context shared by all Claude calls."""
+    org_info = metadata.get('org_info', {})
+    objects = metadata.get('objects', {})
+    flows = metadata.get('flows', [])
+    reports = metadata.get('reports', [])
+    sample_data = metadata.get('sample_data', {})
+
+    # One pass over the object map collects both custom objects and
+    # financial fields
+    custom_objects = []
+    financial_fields = {}
+    for name, obj in objects.items():
+        if obj.get('custom'):
+            custom_objects.append({'name': name, 'label': obj['label']})
+        fields = financial_field_names(obj.get('fields', []))
+        if fields:
+            financial_fields[name] = fields
+
+    active_flows, inactive_flows = [], []
+    for f in flows:
+        (active_flows if f.get('IsActive') else inactive_flows).append(f)
+
+    sample_accounts = [acc['Name'] for acc in sample_data.get('accounts', [])]
+    sample_opportunities = [opp['Name'] for opp in sample_data.get('opportunities', [])]
+
+    custom_object_samples = {}
+    for obj in custom_objects[:5]:
+        if obj['name'] in sample_data:
+            custom_object_samples[obj['name']] = [
+                rec.get('Name') for rec in sample_data[obj['name']] if rec.get('Name')
+            ]
+
+    return {
+        'org_type': org_info.get('OrganizationType'),
+        'is_sandbox': org_info.get('IsSandbox'),
+        'custom_objects': custom_objects[:10],
+        'financial_fields': financial_fields,
+        'flows': {
+            'total': len(active_flows) + len(inactive_flows),
+            'active_count': len(active_flows),
+            'inactive_count': len(inactive_flows),
+            'active': [f['ApiName'] for f in active_flows[:5]],
+            'inactive': [f['ApiName'] for f in inactive_flows[:5]]
+        },
+        'reports': {
+            'total': len(reports),
+            'recent': [
+                {'name': r['Name'], 'folder': r.get('FolderName')}
+                for r in reports[:10]
+            ]
+        },
+        'validation_rules': len(metadata.get('validation_rules', [])),
+        'sample_accounts': sample_accounts[:10] if sample_accounts else ["[No accounts found in org]"],
+        'sample_opportunities': sample_opportunities[:10] if sample_opportunities else ["[No opportunities found]"],
+        'custom_object_samples': custom_object_samples
+    }
+
+
+def build_cached_org_context_blocks(metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Build the system blocks shared by every Claude call.
+
+    The rubric and org context are serialized compactly with sorted keys so
+    that the prefix is byte-identical across scripts and Anthropic can serve
+    it from the prompt cache; only the task-specific ask belongs in the user
+    message.
+    """
+    org_context = build_org_context(metadata)
+    if orjson is not None:
+        context_json = orjson.dumps(org_context, option=orjson.OPT_SORT_KEYS).decode()
+    else:
+        context_json = json.dumps(org_context, separators=(',', ':'), sort_keys=True)
+
+    return [
+        {"type": "text", "text": SYSTEM_RUBRIC},
+        {
+            "type": "text",
+            "text": context_json,
+            "cache_control": {"type": "ephemeral"}
+        }
+    ]